@@ -1,6 +1,11 @@
+from suite.drivers import query_ready
 from suite.test_case import TestCase
 from suite.util import TEST_ENV_INFO, TEST_LOGIN_PAGE
 
+ENV_INFO_LOCATORS = {
+    'env_info': ('id', 'responsive-navbar-nav')
+}
+
 
 class EnvInfo(TestCase):
     def __init__(self, test_suite):
@@ -9,40 +14,33 @@ class EnvInfo(TestCase):
     def name(self):
         return TEST_ENV_INFO
 
+    def depends_on(self):
+        return TEST_LOGIN_PAGE
+
     def assert_case(self):
         self.web_driver.save_screenshot('ss_home')
         self.logger.info(
             'Assert env_info in Self Service landing page.')
-        env_info = str(
-            self.web_driver.find_element_by_id('responsive-navbar-nav').text)
+        with self.step('read env info'):
+            snapshot = self.wait_until(query_ready(ENV_INFO_LOCATORS, 'env_info'),
+                                       self.config['page_load_timeout'], 'env info')
+        assert snapshot, 'env_info not found in Self Service landing page'
+        env_info = str(snapshot['env_info'])
 
         self.logger.debug('Assert env_info... %s', env_info)
 
-        iam_url = self.config['iam_url']
-        self.logger.debug('Assert iam_url to be %s', iam_url)
-        assert env_info.find(iam_url) > 0
-        self.logger.debug('Asserted iam_url to be %s', iam_url)
-
-        domain = self.config['domain']
-        self.logger.debug('Assert domain to be %s', domain)
-        assert env_info.find(domain) > 0
-        self.logger.debug('Asserted domain to be %s', domain)
-
-        environment = self.config['environment']
-        self.logger.debug('Assert environment to be %s', environment)
-        assert env_info.find(environment) > 0
-        self.logger.debug('Asserted environment to be %s', environment)
-
-        release = self.config['release']
-        self.logger.debug('Assert release to be %s', release)
-        assert env_info.find(release) > 0
-        self.logger.debug('Asserted release to be %s', release)
+        for key in ('iam_url', 'domain', 'environment', 'release'):
+            expected = self.config[key]
+            self.logger.debug('Assert %s to be %s', key, expected)
+            assert env_info.find(expected) > 0
+            self.logger.debug('Asserted %s to be %s', key, expected)
 
         self.web_driver.save_screenshot('user_logged_in')
 
-        self.logout(self.config['username'] if self.name(
-        ) == TEST_LOGIN_PAGE else self.config['smoke_test_user'])
-        self.web_driver.save_screenshot('user_logged_out')
+        with self.step('logout'):
+            self.logout(self.config['username'] if self.name(
+            ) == TEST_LOGIN_PAGE else self.config['smoke_test_user'])
+            self.web_driver.save_screenshot('user_logged_out')
 
         self.logger.info(
             'Asserted env_info in Self Service landing page is successful.')
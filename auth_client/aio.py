@@ -0,0 +1,223 @@
+"""
+asyncio counterparts of Authenticate and OAuth2Client for many IAM/IDM calls from one event loop.
+Requires the aiohttp package.
+
+Usage:
+
+async def update_clients(environments, redirect_uri):
+    async with AsyncHttpSession(concurrency=50) as session:
+        async def update(env):
+            auth = await AsyncAuthenticate(env['iam_url'], session=session)\\
+                .add_headers(env['client_id'], env['client_secret'], 2)\\
+                .login(env['username'], env['password'])
+            client = await AsyncOAuth2Client(env['idm_url'], session=session)\\
+                .add_headers(1, auth['access_token'])\\
+                .get_client(env['client_id'])
+            return await client.update_client(redirect_uri)
+
+        return await asyncio.gather(*[update(env) for env in environments])
+"""
+import asyncio
+import base64
+import random
+from json import JSONDecodeError
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncHttpSession:
+    """
+    aiohttp session with a bounded number of requests in flight and retries of transient errors,
+    the asyncio counterpart of auth_client.session.HttpSession.
+    """
+
+    def __init__(self, concurrency=100, pool_maxsize=100, retries=3, backoff_factor=0.5,
+                 status_forcelist=(500, 502, 503, 504), retry_methods=('GET', 'PUT')):
+        """
+        :param concurrency: Number of requests in flight
+        :param pool_maxsize: Number of connections kept open
+        :param retries: Number of retries of connection errors and status_forcelist responses
+        :param backoff_factor: Upper bound of the jittered sleep is backoff_factor * 2 ** (retry - 1) secs
+        :param status_forcelist: Response status codes retried
+        :param retry_methods: HTTP methods retried, POST is left out as it is not idempotent in general
+        """
+        if aiohttp is None:
+            raise ValueError('Invalid input, AsyncHttpSession requires aiohttp')
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self.retry_methods = retry_methods
+        self.session = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_maxsize))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def request(self, method, url, **kwargs):
+        """
+        :return: (status code, json body or text when the body is not json)
+        """
+        retries = self.retries if method in self.retry_methods else 0
+        retry = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    async with self.session.request(method, url, **kwargs) as res:
+                        if res.status not in self.status_forcelist or retry >= retries:
+                            return res.status, await response_body(res)
+            except aiohttp.ClientConnectionError:
+                if retry >= retries:
+                    raise
+            retry += 1
+            await asyncio.sleep(random.uniform(0, self.backoff_factor * 2 ** (retry - 1)))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+async def response_body(res):
+    try:
+        return await res.json(content_type=None)
+    except (JSONDecodeError, ValueError):
+        return (await res.read()).decode('ascii')
+
+
+class AsyncAuthenticate:
+    def __init__(self, url, session, token_cache=None):
+        self.url = url
+        self.headers = {}
+        self.client_id = None
+        self.token_cache = token_cache
+        self.session = session
+
+    def add_headers(self, client_id, client_secret, api_version):
+        client_creds = (
+            base64.encodebytes(":".join([client_id, client_secret]).encode("ascii"))
+            .decode("ascii")
+            .replace("\n", "")
+        )
+
+        self.client_id = client_id
+        self.headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Authorization": "Basic {}".format(client_creds),
+            "api-version": str(api_version),
+        }
+        return self
+
+    async def login(self, username, password):
+        password_grant = {"grant_type": "password", "username": username, "password": password}
+        if self.token_cache is None:
+            return await self.token_request(password_grant)
+
+        key = self.token_cache.key(self.url, self.client_id, username)
+        token = self.token_cache.get(key)
+        if token is not None:
+            return token
+
+        refresh_token = self.token_cache.refresh_token(key)
+        if refresh_token:
+            token = await self.refresh(refresh_token)
+            if isinstance(token, dict) and "access_token" in token:
+                return self.token_cache.put(key, token)
+
+        token = await self.token_request(password_grant)
+        if isinstance(token, dict) and "access_token" in token:
+            return self.token_cache.put(key, token)
+        self.token_cache.invalidate(key)
+        return token
+
+    async def refresh(self, refresh_token):
+        return await self.token_request({"grant_type": "refresh_token", "refresh_token": refresh_token})
+
+    async def token_request(self, data):
+        iam_url = "/".join([self.url, "authorize/oauth2/token"])
+        status, body = await self.session.request("POST", iam_url, headers=self.headers, data=data)
+        if status == 200:
+            print("Authentication successful.")
+        else:
+            print("Failed to authenticate.")
+        return body
+
+
+class AsyncOAuth2Client:
+    """
+    asyncio counterpart of OAuth2Client, updates redirect_uri of an existing client.
+
+    client = await AsyncOAuth2Client('idm_url', session)
+        .add_headers(1, 'access_token')
+        .get_client('client_name')
+    await client.update_client('redirect_uri')
+    """
+
+    def __init__(self, url, session):
+        self.url = ''.join([url, '/authorize/identity/Client'])
+        self.api_version = None
+        self.access_token = None
+        self.headers = {}
+        self.client = {}
+        self.session = session
+
+    def add_headers(self, api_version, access_token):
+        self.api_version = api_version
+        self.access_token = access_token
+        self.headers = {
+            'Authorization': 'Bearer {}'.format(access_token),
+            'api-version': str(api_version),
+            'Content-Type': 'application/json'
+        }
+        return self
+
+    async def get_client(self, client_name):
+        idm_url = ''.join([self.url, '?', 'name={}'.format(client_name)])
+        status, self.client = await self.session.request('GET', idm_url, headers=self.headers)
+        if status == 200:
+            print('OAuth2Client {} found in idm_url: {}'.format(client_name, idm_url))
+        else:
+            print('OAuth2Client {} failed to find in idm_url: {}'.format(client_name, idm_url))
+        return self
+
+    async def update_client(self, redirect_uri):
+        """Add the redirect_uri to every entry of the client which does not have it, entries updated concurrently.
+        :return: same as OAuth2Client.update_client
+        """
+        if 'entry' not in self.client:
+            raise ValueError(
+                'OAuth2Client failed to find an entry in Authorize IAM for {}'.format(redirect_uri))
+        updates = []
+        for entry in self.client['entry']:
+            redirect_uris = entry['redirectionURIs']
+            if redirect_uri not in redirect_uris:
+                redirect_uris.append(redirect_uri)
+                entry['redirectionURIs'] = redirect_uris
+                updates.append(self.put_entry(entry, redirect_uri))
+            else:
+                print('OAuth2 Client {} has the redirect_uri {}'.format(
+                    entry['clientId'], redirect_uri))
+
+        results = await asyncio.gather(*updates)
+        failed = [result for result in results if not (isinstance(result, dict) and 'id' in result)]
+        if failed:
+            return failed[0]
+        return results[-1] if results else 'existing'
+
+    async def put_entry(self, entry, change):
+        status, body = await self.session.request(
+            'PUT', '/'.join([self.url, entry['id']]), headers=self.headers, json=entry)
+        if status == 200:
+            print('OAuth2 Client {} updated for redirect_uri {}'.format(entry['clientId'], change))
+        else:
+            print('OAuth2 Client {} failed to update for redirect_uri {}. request status: {}'
+                  .format(entry['clientId'], change, status))
+        if body is None:
+            return 'Empty response, request status: {}'.format(status)
+        return body
@@ -1,5 +1,11 @@
+import os
+
 from auth_client.authenticate import Authenticate
 from auth_client.client import OAuth2Client
+from auth_client.client_cache import shared_client_cache
+from auth_client.reconcile import reconcile_redirect_uris
+from auth_client.session import shared_session
+from auth_client.token_cache import shared_token_cache
 from suite.input_validator import InputValidator
 
 
@@ -16,20 +22,15 @@ def update_client(authorize_url, deploy_config):
                                       'iam_url', 'idm_url',
                                       'token_api_version', 'client_api_version'
                                       ]):
-        username = deploy_config['org_admin_usr']
-        password = deploy_config['org_admin_pwd']
         client_id = deploy_config['client_id']
-        client_secret = deploy_config['client_secret']
-
-        auth = Authenticate(deploy_config['iam_url'])\
-            .add_headers(client_id, client_secret, deploy_config['token_api_version'])\
-            .login(username, password)
+        auth, session = admin_login(deploy_config)
         if 'access_token' in auth:
             try:
                 authorize_url = '{}/authorize'.format(authorize_url)
-                client_update_res = OAuth2Client(deploy_config['idm_url'])\
+                client_cache = shared_client_cache(deploy_config.get('client_cache_ttl', 300))
+                client_update_res = OAuth2Client(deploy_config['idm_url'], session, client_cache)\
                     .add_headers(deploy_config['client_api_version'], auth['access_token'])\
-                    .get_client(client_id).update_client(authorize_url)
+                    .get_client(client_id, revalidate=True).update_client(authorize_url)
 
                 if client_update_res is not None and 'existing' not in client_update_res and 'id' not in client_update_res:
                     err_msg = client_update_res
@@ -47,6 +48,50 @@ def update_client(authorize_url, deploy_config):
                   .format(client_id, authorize_url, auth))
 
 
+def add_redirect_uris(authorize_urls, deploy_config):
+    """Adds every authorize_url/authorize to the OAuth2 Client in one read and one write per entry,
+    e.g. for the targets of a smoke test matrix sharing the client, which would overwrite each other's
+    redirect_uri when updating the client at the same time.
+
+    :param authorize_urls: URLs used to update
+    :param deploy_config: Deployment configuration to use to update client.
+
+    :return: None
+    """
+    if InputValidator(deploy_config, ['username', 'password',
+                                      'client_id', 'client_secret',
+                                      'iam_url', 'idm_url',
+                                      'token_api_version', 'client_api_version'
+                                      ]):
+        client_id = deploy_config['client_id']
+        redirect_uris = list(dict.fromkeys('{}/authorize'.format(authorize_url) for authorize_url in authorize_urls))
+        auth, session = admin_login(deploy_config)
+        if 'access_token' in auth:
+            report = reconcile_redirect_uris(deploy_config['idm_url'], deploy_config['client_api_version'],
+                                             auth['access_token'], {client_id: redirect_uris}, remove=False,
+                                             session=session,
+                                             cache=shared_client_cache(deploy_config.get('client_cache_ttl', 300)))
+            for error in report[client_id]['errors']:
+                print('OAuth2 Client {} failed to update for redirect_uris "{}". Error found to be: "{}"'
+                      .format(client_id, ', '.join(redirect_uris), error))
+        else:
+            print('OAuth2 Client {} failed to update for redirect_uris "{}". Error found to be: "{}"'
+                  .format(client_id, ', '.join(redirect_uris),
+                          auth.get('error_description', auth) if isinstance(auth, dict) else auth))
+
+
+def admin_login(deploy_config):
+    """Log the org admin in with the client credentials of the deployment configuration.
+    :return: (auth response, HttpSession shared with the OAuth2Client calls)
+    """
+    token_cache = shared_token_cache(deploy_config.get('token_cache_file'), os.environ.get('TOKEN_CACHE_KEY'))
+    session = shared_session(**deploy_config.get('http_session', {}))
+    auth = Authenticate(deploy_config['iam_url'], token_cache, session)\
+        .add_headers(deploy_config['client_id'], deploy_config['client_secret'], deploy_config['token_api_version'])\
+        .login(deploy_config['org_admin_usr'], deploy_config['org_admin_pwd'])
+    return auth, session
+
+
 if __name__ == '__main__':
     update_client('12345', {
         'username': '',
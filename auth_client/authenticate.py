@@ -1,12 +1,16 @@
-import requests
 import base64
 from json import JSONDecodeError
 
+from auth_client.session import shared_session
+
 
 class Authenticate:
-    def __init__(self, url):
+    def __init__(self, url, token_cache=None, session=None):
         self.url = url
         self.headers = {}
+        self.client_id = None
+        self.token_cache = token_cache
+        self.session = session or shared_session()
 
     def add_headers(self, client_id, client_secret, api_version):
         client_creds = (
@@ -15,6 +19,7 @@ class Authenticate:
             .replace("\n", "")
         )
 
+        self.client_id = client_id
         self.headers = headers = {
             "Content-Type": "application/x-www-form-urlencoded",
             "Authorization": "Basic {}".format(client_creds),
@@ -23,14 +28,39 @@ class Authenticate:
         return self
 
     def login(self, username, password):
-        iam_url = "/".join([self.url, "authorize/oauth2/token"])
-        res = requests.post(
-            iam_url,
-            headers=self.headers,
-            data="grant_type=password&username={}&password={}".format(
-                username, password
-            ),
+        if self.token_cache is None:
+            return self.token_request(
+                "grant_type=password&username={}&password={}".format(username, password)
+            )
+
+        key = self.token_cache.key(self.url, self.client_id, username)
+        token = self.token_cache.get(key)
+        if token is not None:
+            print("Authentication reused from token cache.")
+            return token
+
+        refresh_token = self.token_cache.refresh_token(key)
+        if refresh_token:
+            token = self.refresh(refresh_token)
+            if isinstance(token, dict) and "access_token" in token:
+                return self.token_cache.put(key, token)
+
+        token = self.token_request(
+            "grant_type=password&username={}&password={}".format(username, password)
         )
+        if isinstance(token, dict) and "access_token" in token:
+            return self.token_cache.put(key, token)
+        self.token_cache.invalidate(key)
+        return token
+
+    def refresh(self, refresh_token):
+        return self.token_request(
+            {"grant_type": "refresh_token", "refresh_token": refresh_token}
+        )
+
+    def token_request(self, data):
+        iam_url = "/".join([self.url, "authorize/oauth2/token"])
+        res = self.session.post(iam_url, headers=self.headers, data=data)
         if res.status_code == 200:
             print("Authentication successful.")
         else:
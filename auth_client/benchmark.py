@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of Authenticate and OAuth2Client against the local stand-in, or a given IAM/IDM.
+Usage:
+python -m auth_client.benchmark --requests 500 --workers 16 --latency 0.01
+
+Modes:
+    sequential  one request after the other, each on a new session (new connection per request)
+    pooled      one request after the other on a shared keep-alive HttpSession
+    concurrent  --workers requests in flight on a shared HttpSession
+
+Reports requests/second and p50/p95/p99 latency per mode and operation.
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auth_client.authenticate import Authenticate
+from auth_client.client import OAuth2Client
+from auth_client.session import HttpSession
+from auth_client.stand_in import StandIn
+from suite.history import percentile
+from suite.util import print_separator
+
+SEQUENTIAL = 'sequential'
+POOLED = 'pooled'
+CONCURRENT = 'concurrent'
+
+
+def login(url, session):
+    return Authenticate(url, session=session).add_headers('benchmark', 'secret', 2).login('benchmark', 'secret')
+
+
+def get_client(url, session):
+    return OAuth2Client(url, session).add_headers(1, 'token').get_client('benchmark').client
+
+
+OPERATIONS = {
+    'token': login,
+    'client': get_client
+}
+
+
+def run(operation, url, mode, requests, workers, pool_maxsize):
+    """
+    :return: (requests/second, sorted latencies in ms, errors)
+    """
+    # Retries would hide the errors and add backoff sleeps to the latencies, for GET but not for POST.
+    shared = HttpSession(pool_maxsize=pool_maxsize, retries=0) if mode != SEQUENTIAL else None
+
+    def timed(_):
+        session = shared or HttpSession(retries=0)
+        start = time.perf_counter()
+        try:
+            result = operation(url, session)
+            error = not isinstance(result, dict) or 'error' in result or 'issue' in result
+        except Exception:
+            error = True
+        latency_ms = (time.perf_counter() - start) * 1000
+        if shared is None:
+            session.close()
+        return latency_ms, error
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == CONCURRENT:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(timed, range(requests)))
+        else:
+            results = [timed(index) for index in range(requests)]
+    elapsed = time.perf_counter() - start
+    if shared is not None:
+        shared.close()
+
+    return requests / elapsed, sorted(latency_ms for latency_ms, error in results), \
+        len([error for latency_ms, error in results if error])
+
+
+def report(results):
+    lines = [' '.join([print_separator('#'), 'AUTH CLIENT BENCHMARK', print_separator('#')]),
+             '\t\t'.join(['OPERATION', 'MODE', 'REQ/S', 'P50', 'P95', 'P99', 'ERRORS']),
+             print_separator('=')]
+    for operation, mode, rps, latencies, errors in results:
+        lines.append('{} {} {:.1f} {:.1f} ms {:.1f} ms {:.1f} ms {}'.format(
+            operation, mode, rps, percentile(latencies, 50), percentile(latencies, 95),
+            percentile(latencies, 99), errors))
+    lines.append(print_separator('='))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', dest='url', action='store',
+                        help='IAM/IDM URL to benchmark, defaults to a local stand-in.')
+    parser.add_argument('--requests', dest='requests', type=int, default=200, action='store')
+    parser.add_argument('--workers', dest='workers', type=int, default=8, action='store')
+    parser.add_argument('--latency', dest='latency', type=float, default=0.0, action='store',
+                        help='Secs each stand-in request is delayed.')
+    parser.add_argument('--error-rate', dest='error_rate', type=float, default=0.0, action='store',
+                        help='Probability of the stand-in replying 503.')
+    parser.add_argument('--payload-size', dest='payload_size', type=int, default=0, action='store',
+                        help='Size in bytes of the padding added to stand-in responses.')
+    args = parser.parse_args()
+
+    stand_in = None
+    url = args.url
+    if not url:
+        stand_in = StandIn(latency=args.latency, error_rate=args.error_rate, payload_size=args.payload_size).start()
+        url = stand_in.url
+
+    results = []
+    for name, operation in OPERATIONS.items():
+        for mode in (SEQUENTIAL, POOLED, CONCURRENT):
+            rps, latencies, errors = run(operation, url, mode, args.requests, args.workers, args.workers)
+            results.append((name, mode, rps, latencies, errors))
+
+    if stand_in is not None:
+        stand_in.stop()
+    print(report(results))
@@ -1,7 +1,7 @@
-import requests
-from auth_client.authenticate import Authenticate
 from json import JSONDecodeError
 
+from auth_client.session import shared_session
+
 
 class OAuth2Client:
     """
@@ -9,20 +9,25 @@ class OAuth2Client:
     Usage: Use the following flow of methods to update redirect_uri for an existing client.
 
     access_token - Use Authenticate to get the access token from IAM API.
+    session - HttpSession shared with Authenticate, defaults to the process wide shared_session().
+    cache - Optional ClientCache, get_client reuses or revalidates the cached client.
+            Fetch with revalidate=True before update_client, a write must not be based on a stale client.
 
     OAuth2Client('idm_url')
         .add_headers(1, 'access_token')
-        .get_client('client_name')
+        .get_client('client_name', revalidate=True)
         .update_client('redirect_uri')
     """
 
-    def __init__(self, url):
+    def __init__(self, url, session=None, cache=None):
         super(OAuth2Client, self).__init__()
         self.url = ''.join([url, '/authorize/identity/Client'])
         self.api_version = None
         self.access_token = None
         self.headers = {}
         self.client = {}
+        self.session = session or shared_session()
+        self.cache = cache
 
     def add_headers(self, api_version, access_token):
         self.api_version = api_version
@@ -34,14 +39,34 @@ class OAuth2Client:
         }
         return self
 
-    def get_client(self, client_name):
+    def get_client(self, client_name, revalidate=False):
+        """Fetch the client, from the cache when it was fetched less than the cache ttl ago.
+        :param revalidate: Revalidate the cached client with a conditional GET even when it is fresh,
+                           e.g. before writing an entry of it, a 304 still reuses the cached client
+        """
         query = 'name={}'.format(client_name)
         idm_url = ''.join([self.url, '?', query])
-        res = requests.get(idm_url, headers=self.headers)
-        if res.status_code == 200:
+
+        cached = self.cache.get(idm_url) if self.cache else None
+        if cached is not None and self.cache.fresh(cached) and not revalidate:
+            print('OAuth2Client {} found in client cache for idm_url: {}'.format(
+                client_name, idm_url))
+            self.client = cached['client']
+            return self
+
+        headers = dict(self.headers, **self.cache.validators(cached)) if cached else self.headers
+        res = self.session.get(idm_url, headers=headers)
+        if res.status_code == 304:
+            print('OAuth2Client {} not modified in idm_url: {}'.format(
+                client_name, idm_url))
+            self.cache.touch(idm_url)
+            self.client = cached['client']
+        elif res.status_code == 200:
             print('OAuth2Client {} found in idm_url: {}'.format(
                 client_name, idm_url))
             self.client = res.json()
+            if self.cache:
+                self.cache.put(idm_url, self.client, res.headers)
         else:
             print('OAuth2Client {} failed to find in idm_url: {}'.format(
                 client_name, idm_url))
@@ -52,27 +77,48 @@ class OAuth2Client:
         return self
 
     def update_client(self, redirect_uri):
+        """Add the redirect_uri to every entry of the client which does not have it.
+        :return: 'existing' if all entries have it, else the response of the first failed update,
+                 or of the last update when all succeeded
+        """
         if 'entry' not in self.client:
             raise ValueError(
                 'OAuth2Client failed to find an entry in Authorize IAM for {}'.format(redirect_uri))
+        results = []
         for entry in self.client['entry']:
             redirect_uris = entry['redirectionURIs']
             if redirect_uri not in redirect_uris:
                 redirect_uris.append(redirect_uri)
                 entry['redirectionURIs'] = redirect_uris
-
-                res = requests.put(
-                    '/'.join([self.url, entry['id']]), headers=self.headers, json=entry)
-                res_status_code = res.status_code
-                if res_status_code == 200:
-                    print('OAuth2 Client {} updated for redirect_uri {}'.format(
-                        entry['clientId'], redirect_uri))
-                else:
-                    print('OAuth2 Client {} failed to update for redirect_uri {}. request status: {}'
-                          .format(entry['clientId'], redirect_uri, res_status_code))
-
-                return res.json()
+                results.append(self.put_entry(entry, redirect_uri))
             else:
                 print('OAuth2 Client {} has the redirect_uri {}'.format(
                     entry['clientId'], redirect_uri))
-                return 'existing'
+
+        failed = [result for result in results if not (isinstance(result, dict) and 'id' in result)]
+        if failed:
+            return failed[0]
+        return results[-1] if results else 'existing'
+
+    def put_entry(self, entry, change):
+        """Write a client entry.
+        :param entry: Client entry with the updated redirectionURIs
+        :param change: Description of the change used in the logs
+        :return: response json, or text when the response is not json
+        """
+        res = self.session.put(
+            '/'.join([self.url, entry['id']]), headers=self.headers, json=entry)
+        if self.cache:
+            self.cache.invalidate_entry(entry['id'])
+        res_status_code = res.status_code
+        if res_status_code == 200:
+            print('OAuth2 Client {} updated for redirect_uri {}'.format(
+                entry['clientId'], change))
+        else:
+            print('OAuth2 Client {} failed to update for redirect_uri {}. request status: {}'
+                  .format(entry['clientId'], change, res_status_code))
+
+        try:
+            return res.json()
+        except JSONDecodeError:
+            return res.content.decode('ascii')
@@ -0,0 +1,73 @@
+import copy
+import threading
+import time
+
+
+class ClientCache:
+    """
+    Caches OAuth2 client resources fetched by OAuth2Client.get_client, keyed by request URL.
+    Usage: Pass the cache to OAuth2Client, get_client reuses it.
+
+    OAuth2Client('idm_url', cache=ClientCache(ttl=300))
+
+    Within ttl secs of the last fetch the cached client is returned without a request. After that the
+    client is revalidated with If-None-Match / If-Modified-Since and a 304 reuses the cached client.
+    Writes through OAuth2Client.put_entry invalidate the cached clients containing the entry. A client fetched
+    to be written is revalidated whatever its age, see OAuth2Client.get_client(revalidate=True).
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        """Cached client of the URL, None if not cached.
+        :return: {'client', 'etag', 'last_modified', 'fetched_at'}
+        """
+        with self.lock:
+            cached = self.clients.get(url)
+        return copy.deepcopy(cached) if cached else None
+
+    def fresh(self, cached):
+        return time.time() - cached['fetched_at'] < self.ttl
+
+    def validators(self, cached):
+        """Conditional request headers of the cached client."""
+        headers = {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+
+    def put(self, url, client, headers):
+        with self.lock:
+            self.clients[url] = {
+                'client': copy.deepcopy(client),
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'fetched_at': time.time()
+            }
+
+    def touch(self, url):
+        with self.lock:
+            if url in self.clients:
+                self.clients[url]['fetched_at'] = time.time()
+
+    def invalidate_entry(self, entry_id):
+        with self.lock:
+            for url in [url for url, cached in self.clients.items()
+                        if any(entry.get('id') == entry_id for entry in cached['client'].get('entry', []))]:
+                del self.clients[url]
+
+
+default_client_cache = None
+
+
+def shared_client_cache(ttl=300):
+    """Client cache shared by the clients of the process, created with ttl on first use."""
+    global default_client_cache
+    if default_client_cache is None:
+        default_client_cache = ClientCache(ttl)
+    return default_client_cache
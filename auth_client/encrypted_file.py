@@ -0,0 +1,68 @@
+import gzip
+import json
+import logging
+import os
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+    InvalidToken = ValueError
+
+LOGGER = logging.getLogger('deploy')
+
+
+class EncryptedJsonFile:
+    """
+    JSON document persisted to a file readable by the owner only, encrypted with Fernet,
+    which requires the cryptography package. Used by the caches persisting secrets, e.g. TokenCache.
+    Usage:
+
+    store = EncryptedJsonFile('tokens.bin', Fernet.generate_key(), 'tokens')
+    store.save({'key': 'value'})
+    store.load()
+    """
+
+    def __init__(self, path, secret, content='data', compress=False):
+        """
+        :param path: File the document is persisted to
+        :param secret: Fernet key
+        :param content: What the document holds, used in the error messages
+        :param compress: Gzip the JSON before encrypting it, for large documents
+        """
+        if Fernet is None or not secret:
+            raise ValueError('Invalid input, persisting {} to {} requires cryptography and a secret'
+                             .format(content, path))
+        self.path = path
+        self.fernet = Fernet(secret)
+        self.compress = compress
+
+    def load(self):
+        """Document of the file, None if the file does not exist or cannot be read back, e.g. after the
+        secret was rotated or the file was truncated. The caches start empty then and overwrite the file.
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as _f:
+                content = self.fernet.decrypt(_f.read())
+            return json.loads((gzip.decompress(content) if self.compress else content).decode('utf-8'))
+        except (InvalidToken, ValueError, OSError, EOFError) as error:
+            LOGGER.warning('Ignoring %s, it cannot be decrypted with the secret: %s', self.path,
+                           type(error).__name__)
+            return None
+
+    def save(self, document):
+        content = json.dumps(document).encode('utf-8')
+        content = self.fernet.encrypt(gzip.compress(content) if self.compress else content)
+        with open(os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as _f:
+            _f.write(content)
+
+
+def shared_by_path(instances, path, factory):
+    """Instance of the process for a persistence file, created with factory on first use.
+    :param instances: {path: instance} of the process
+    """
+    if path not in instances:
+        instances[path] = factory()
+    return instances[path]
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+"""
+Load generator for the IAM password grant, built on Authenticate.
+Usage:
+python -m auth_client.load --url https://iam --client-id id --username user --rps 50 --ramp-up 30 --duration 300
+python -m auth_client.load --stand-in --concurrency 32 --duration 60
+
+The client secret and password are read from the IAM_CLIENT_SECRET and IAM_PASSWORD environment variables.
+With --rps requests are started at the target rate, ramped up linearly, and latency is measured from the
+scheduled start so a slow IAM is not hidden by the load generator waiting for it. With --concurrency
+each worker sends a request as soon as the previous one completed.
+Reports a latency histogram with percentiles and a breakdown of errors.
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from auth_client.authenticate import Authenticate
+from auth_client.session import HttpSession
+from auth_client.stand_in import StandIn
+from suite.util import print_separator
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of latencies in microsecs: log-linear buckets with a relative error of
+    2 ** -sub_bucket_bits, constant memory whatever the number of values recorded.
+    """
+
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.lock = threading.Lock()
+
+    def record(self, value_us):
+        value_us = int(value_us)
+        shift = max(value_us.bit_length() - self.sub_bucket_bits, 0)
+        with self.lock:
+            self.buckets[(shift, value_us >> shift)] += 1
+            self.count += 1
+            self.total += value_us
+            self.max = max(self.max, value_us)
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the percentile, in microsecs."""
+        threshold = percent / 100.0 * self.count
+        seen = 0
+        for shift, sub_bucket in sorted(self.buckets, key=lambda bucket: bucket[1] << bucket[0]):
+            seen += self.buckets[(shift, sub_bucket)]
+            if seen >= threshold:
+                return min(((sub_bucket + 1) << shift) - 1, self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+
+class LoadGenerator:
+    def __init__(self, url, client_id, client_secret, api_version, username, password, workers):
+        """
+        :param url: IAM URL
+        :param workers: Maximum number of requests in flight
+        """
+        self.url = url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_version = api_version
+        self.username = username
+        self.password = password
+        self.workers = workers
+        # Retries would hide the errors the load test is looking for.
+        self.session = HttpSession(pool_maxsize=workers, retries=0)
+        self.histogram = LatencyHistogram()
+        self.errors = Counter()
+
+    def login(self, scheduled):
+        """Send a password grant, latency is measured from the scheduled start."""
+        try:
+            token = Authenticate(self.url, session=self.session)\
+                .add_headers(self.client_id, self.client_secret, self.api_version)\
+                .login(self.username, self.password)
+            if not isinstance(token, dict):
+                error = 'non-json response'
+            elif 'access_token' not in token:
+                error = token.get('error', 'no access_token')
+            else:
+                error = None
+        except Exception as err:
+            error = type(err).__name__
+        self.histogram.record((time.perf_counter() - scheduled) * 1e6)
+        if error:
+            with self.histogram.lock:
+                self.errors[error] += 1
+
+    def run_rate(self, rps, ramp_up, duration):
+        """Open loop: start requests at rps, ramped up linearly over ramp_up secs, for duration secs."""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            start = time.perf_counter()
+            count = 0
+            while True:
+                elapsed = self.scheduled_at(count, rps, ramp_up)
+                if elapsed >= duration:
+                    break
+                scheduled = start + elapsed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.login, scheduled)
+                count += 1
+            delay = start + duration - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    @staticmethod
+    def scheduled_at(count, rps, ramp_up):
+        """Secs after the start the request number count is due, from the number of requests the
+        ramp has sent by then: rps * t ** 2 / (2 * ramp_up) while ramping up, then rps * t.
+        """
+        ramp_requests = rps * ramp_up / 2.0
+        if count < ramp_requests:
+            return math.sqrt(2.0 * ramp_up * count / rps)
+        return ramp_up + (count - ramp_requests) / rps
+
+    def run_concurrency(self, concurrency, ramp_up, duration):
+        """Closed loop: concurrency workers, started evenly over ramp_up secs."""
+        deadline = time.perf_counter() + duration
+
+        def worker(index):
+            time.sleep(ramp_up * index / concurrency)
+            while time.perf_counter() < deadline:
+                self.login(time.perf_counter())
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, range(concurrency)))
+
+    def report(self, elapsed):
+        histogram = self.histogram
+        lines = [' '.join([print_separator('#'), 'IAM LOGIN LOAD', print_separator('#')]),
+                 'TARGET: {}'.format(self.url),
+                 'REQUESTS: {}'.format(histogram.count),
+                 'THROUGHPUT: {:.1f} req/s'.format(histogram.count / elapsed if elapsed else 0),
+                 'ERRORS: {}'.format(sum(self.errors.values())),
+                 print_separator('-'),
+                 'LATENCY MEAN: {:.1f} ms'.format(histogram.mean() / 1000)]
+        for percent in (50, 75, 90, 95, 99, 99.9, 100):
+            lines.append('LATENCY P{}: {:.1f} ms'.format(percent, histogram.percentile(percent) / 1000))
+        if self.errors:
+            lines.append(print_separator('-'))
+            for error, count in self.errors.most_common():
+                lines.append('ERROR {}: {}'.format(error, count))
+        lines.append(print_separator('='))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', dest='url', action='store', help='IAM URL to load.')
+    parser.add_argument('--stand-in', dest='stand_in', action='store_true',
+                        help='Load a local stand-in instead of --url.')
+    parser.add_argument('--client-id', dest='client_id', default='load', action='store')
+    parser.add_argument('--api-version', dest='api_version', default=2, action='store')
+    parser.add_argument('--username', dest='username', default='load', action='store')
+    load = parser.add_mutually_exclusive_group(required=True)
+    load.add_argument('--rps', dest='rps', type=float, action='store', help='Target requests per second.')
+    load.add_argument('--concurrency', dest='concurrency', type=int, action='store',
+                      help='Number of requests in flight.')
+    parser.add_argument('--workers', dest='workers', type=int, default=64, action='store',
+                        help='Maximum number of requests in flight with --rps.')
+    parser.add_argument('--ramp-up', dest='ramp_up', type=float, default=0, action='store',
+                        help='Secs to ramp up to the target load.')
+    parser.add_argument('--duration', dest='duration', type=float, default=60, action='store',
+                        help='Secs to run, including the ramp up.')
+    parser.add_argument('--latency', dest='latency', type=float, default=0.0, action='store',
+                        help='Secs each stand-in request is delayed.')
+    parser.add_argument('--error-rate', dest='error_rate', type=float, default=0.0, action='store',
+                        help='Probability of the stand-in replying 503.')
+    args = parser.parse_args()
+    if not args.url and not args.stand_in:
+        parser.error('one of the arguments --url --stand-in is required')
+
+    stand_in = StandIn(latency=args.latency, error_rate=args.error_rate).start() if args.stand_in else None
+    generator = LoadGenerator(stand_in.url if stand_in else args.url, args.client_id,
+                              os.environ.get('IAM_CLIENT_SECRET', ''), args.api_version, args.username,
+                              os.environ.get('IAM_PASSWORD', ''),
+                              args.concurrency or args.workers)
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if args.rps:
+            generator.run_rate(args.rps, args.ramp_up, args.duration)
+        else:
+            generator.run_concurrency(args.concurrency, args.ramp_up, args.duration)
+    elapsed = time.perf_counter() - started
+
+    if stand_in is not None:
+        stand_in.stop()
+    print(generator.report(elapsed))
@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from auth_client.client import OAuth2Client
+
+
+def diff_redirect_uris(current, desired, remove):
+    """Minimal change from the current to the desired redirect URIs, the order of the kept URIs is preserved.
+    :return: (redirect URIs to write, added, removed)
+    """
+    added = [uri for uri in desired if uri not in current]
+    removed = [uri for uri in current if uri not in desired] if remove else []
+    return [uri for uri in current if uri not in removed] + added, added, removed
+
+
+def reconcile_redirect_uris(idm_url, api_version, access_token, desired, remove=True, workers=8, session=None,
+                            cache=None):
+    """Reconcile the redirect URIs of many OAuth2 clients, e.g. for a blue/green cutover.
+
+    The clients are fetched in parallel, each entry is diffed against the desired redirect URIs and
+    only the entries which changed are written, in parallel.
+
+    :param idm_url: IDM URL
+    :param api_version: Client API version
+    :param access_token: Access token from Authenticate
+    :param desired: {client_name: [redirect_uri]}
+    :param remove: Remove the redirect URIs which are not desired, else only add the missing ones
+    :param workers: Number of requests in flight
+    :param session: HttpSession, defaults to the process wide shared_session()
+    :param cache: Optional ClientCache used to fetch the clients
+    :return: {client_name: {'updated': [entry ids], 'unchanged': [entry ids],
+                            'added': [uris], 'removed': [uris], 'errors': [error]}}
+    """
+    def new_client():
+        return OAuth2Client(idm_url, session, cache).add_headers(api_version, access_token)
+
+    def fetch(client_name):
+        # The entries are written back whole, revalidate a cached client so another writer's change is kept.
+        return new_client().get_client(client_name, revalidate=True).client
+
+    report = {name: {'updated': [], 'unchanged': [], 'added': [], 'removed': [], 'errors': []}
+              for name in desired}
+    changes = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fetches = [(client_name, executor.submit(fetch, client_name)) for client_name in desired]
+        for client_name, future in fetches:
+            try:
+                client = future.result()
+            except Exception as error:
+                report[client_name]['errors'].append(describe_error(error))
+                continue
+            if not isinstance(client, dict) or 'entry' not in client:
+                report[client_name]['errors'].append(client)
+                continue
+            for entry in client['entry']:
+                try:
+                    redirect_uris, added, removed = diff_redirect_uris(
+                        entry['redirectionURIs'], desired[client_name], remove)
+                except Exception as error:
+                    report[client_name]['errors'].append(describe_error(error))
+                    continue
+                if not added and not removed:
+                    report[client_name]['unchanged'].append(entry['id'])
+                    continue
+                entry['redirectionURIs'] = redirect_uris
+                change = ' '.join(['+{}'.format(uri) for uri in added] + ['-{}'.format(uri) for uri in removed])
+                changes.append((client_name, entry, added, removed,
+                                executor.submit(new_client().put_entry, entry, change)))
+
+        for client_name, entry, added, removed, future in changes:
+            try:
+                result = future.result()
+            except Exception as error:
+                result = describe_error(error)
+            if isinstance(result, dict) and 'id' in result:
+                report[client_name]['updated'].append(entry['id'])
+                report[client_name]['added'].extend(added)
+                report[client_name]['removed'].extend(removed)
+            else:
+                report[client_name]['errors'].append(result)
+
+    return report
+
+
+def describe_error(error):
+    """Error of a request which raised, as recorded in the reconcile report."""
+    return '{}: {}'.format(type(error).__name__, error)
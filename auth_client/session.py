@@ -0,0 +1,100 @@
+import random
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class JitteredRetry(Retry):
+    """Retry with exponential backoff and full jitter: sleep a random time up to the exponential backoff."""
+
+    def get_backoff_time(self):
+        backoff = super(JitteredRetry, self).get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+
+class HttpSession:
+    """
+    Keep-alive HTTP session with connection pooling and retries of transient errors,
+    shared by Authenticate and OAuth2Client to skip the TCP+TLS handshake of each request.
+    Usage:
+
+    session = HttpSession(pool_maxsize=20, retries=5)
+    Authenticate('iam_url', session=session)
+    OAuth2Client('idm_url', session=session)
+    session.stats()
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, retries=3, backoff_factor=0.5,
+                 status_forcelist=(500, 502, 503, 504), retry_methods=('GET', 'PUT')):
+        """
+        :param pool_connections: Number of hosts with a connection pool
+        :param pool_maxsize: Number of connections kept per host
+        :param retries: Number of retries of connection errors and status_forcelist responses
+        :param backoff_factor: Upper bound of the jittered sleep is backoff_factor * 2 ** (retry - 1) secs
+        :param status_forcelist: Response status codes retried
+        :param retry_methods: HTTP methods retried, POST is left out as it is not idempotent in general,
+                              a session whose POST requests can safely be repeated may add it
+        """
+        retry = JitteredRetry(total=retries, backoff_factor=backoff_factor, status_forcelist=status_forcelist,
+                              allowed_methods=frozenset(retry_methods), raise_on_status=False)
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        parts = urlsplit(url)
+        with self.lock:
+            self.requests['{}://{}'.format(parts.scheme, parts.netloc)] += 1
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def stats(self):
+        """Connection reuse per host.
+        :return: {host: {'calls': calls made through the session,
+                         'requests': requests sent including retries,
+                         'connections': connections opened,
+                         'reused': requests sent on a kept-alive connection}}
+        """
+        pools = self.adapter.poolmanager.pools
+        stats = {}
+        for key in pools.keys():
+            pool = pools[key]
+            host = '{}://{}'.format(key.key_scheme, key.key_host if key.key_port in (None, 80, 443)
+                                    else '{}:{}'.format(key.key_host, key.key_port))
+            stats[host] = {'requests': pool.num_requests,
+                           'connections': pool.num_connections,
+                           'reused': pool.num_requests - pool.num_connections}
+        with self.lock:
+            for host, count in self.requests.items():
+                stats.setdefault(host, {'requests': 0, 'connections': 0, 'reused': 0})['calls'] = count
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+default_session = None
+
+
+def shared_session(**kwargs):
+    """Session shared by the clients of the process, created with kwargs on first use."""
+    global default_session
+    if default_session is None:
+        default_session = HttpSession(**kwargs)
+    return default_session
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+"""
+Local stand-in for the IAM token and IDM Client endpoints called by Authenticate and OAuth2Client,
+to measure and regression-test auth_client without a live IAM.
+Usage:
+python -m auth_client.stand_in --port 8080 --latency 0.05 --error-rate 0.01
+
+    POST /authorize/oauth2/token           password and refresh_token grants
+    GET  /authorize/identity/Client?name=  client by name, with ETag / 304 support
+    PUT  /authorize/identity/Client/<id>   client entry update
+
+Clients are created on first lookup with an empty list of redirectionURIs.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+TOKEN_PATH = '/authorize/oauth2/token'
+CLIENT_PATH = '/authorize/identity/Client'
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+    """Keep-alive request handler replying JSON, base of the stand-in handlers."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body, headers=None):
+        """Reply body, encoded as JSON unless it is bytes already."""
+        content = b'' if body is None else body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if content:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class StandInServer:
+    """
+    Threading HTTP server of a stand-in, serving on a background thread once started.
+    Subclasses keep their state on self.server, which the handler reads as self.server.
+    """
+    thread_name = 'stand-in'
+
+    def __init__(self, handler, port=0):
+        """
+        :param handler: JsonHandler subclass serving the requests
+        :param port: Port to listen on, 0 picks a free port
+        """
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server.server_address)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name=self.thread_name, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class StandInHandler(JsonHandler):
+    def do_POST(self):
+        if not self.prepare():
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if urlsplit(self.path).path != TOKEN_PATH:
+            return self.reply(404, {'error': 'not_found'})
+        if not self.headers.get('Authorization', '').startswith('Basic '):
+            return self.reply(401, {'error': 'invalid_client', 'error_description': 'Missing client credentials'})
+        grant_type = parse_qs(body.decode('utf-8')).get('grant_type', [''])[0]
+        if grant_type not in ('password', 'refresh_token'):
+            return self.reply(400, {'error': 'unsupported_grant_type', 'error_description': grant_type})
+        self.reply(200, {'access_token': uuid.uuid4().hex,
+                         'refresh_token': uuid.uuid4().hex,
+                         'token_type': 'Bearer',
+                         'expires_in': 1799,
+                         'padding': self.server.padding})
+
+    def do_GET(self):
+        if not self.prepare():
+            return
+        url = urlsplit(self.path)
+        if url.path != CLIENT_PATH:
+            return self.reply(404, {'error': 'not_found'})
+        name = parse_qs(url.query).get('name', [''])[0]
+        with self.server.lock:
+            entry = self.server.clients.setdefault(name, {'id': hashlib.sha1(name.encode('utf-8')).hexdigest(),
+                                                          'clientId': name,
+                                                          'name': name,
+                                                          'redirectionURIs': [],
+                                                          'padding': self.server.padding})
+            client = {'total': 1, 'entry': [entry]}
+            content = json.dumps(client).encode('utf-8')
+        etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            return self.reply(304, None, {'ETag': etag})
+        self.reply(200, content, {'ETag': etag})
+
+    def do_PUT(self):
+        if not self.prepare():
+            return
+        entry = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+        entry_id = urlsplit(self.path).path[len(CLIENT_PATH) + 1:]
+        with self.server.lock:
+            for name, existing in self.server.clients.items():
+                if existing['id'] == entry_id:
+                    self.server.clients[name] = entry
+                    return self.reply(200, entry)
+        self.reply(404, {'issue': [{'diagnostics': 'Client {} not found'.format(entry_id)}]})
+
+    def prepare(self):
+        """Apply the configured latency and error rate, False if an error was replied."""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            if self.command in ('POST', 'PUT'):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self.reply(503, {'error': 'unavailable'})
+            return False
+        return True
+
+
+class StandIn(StandInServer):
+    """
+    Stand-in server running on a background thread.
+    Usage:
+
+    with StandIn(latency=0.01) as stand_in:
+        Authenticate(stand_in.url).add_headers('id', 'secret', 2).login('user', 'password')
+    """
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, payload_size=0):
+        """
+        :param port: Port to listen on, 0 picks a free port
+        :param latency: Secs each request is delayed
+        :param error_rate: Probability of replying 503
+        :param payload_size: Size in bytes of the padding added to the token and client responses
+        """
+        super().__init__(StandInHandler, port)
+        self.server.latency = latency
+        self.server.error_rate = error_rate
+        self.server.padding = 'x' * payload_size
+        self.server.clients = {}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', dest='port', type=int, default=8080, action='store')
+    parser.add_argument('--latency', dest='latency', type=float, default=0.0, action='store',
+                        help='Secs each request is delayed.')
+    parser.add_argument('--error-rate', dest='error_rate', type=float, default=0.0, action='store',
+                        help='Probability of replying 503.')
+    parser.add_argument('--payload-size', dest='payload_size', type=int, default=0, action='store',
+                        help='Size in bytes of the padding added to responses.')
+    args = parser.parse_args()
+
+    stand_in = StandIn(args.port, args.latency, args.error_rate, args.payload_size)
+    print('Stand-in IAM/IDM listening on {}'.format(stand_in.url))
+    try:
+        stand_in.server.serve_forever()
+    except KeyboardInterrupt:
+        stand_in.server.server_close()
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from auth_client.encrypted_file import EncryptedJsonFile, shared_by_path
+
+
+class TokenCache:
+    """
+    Caches IAM tokens keyed by (iam_url, client_id, username) so repeated logins skip the password grant.
+    Usage: Pass the cache to Authenticate, login returns the cached token until it is about to expire.
+
+    Authenticate('iam_url', token_cache=TokenCache())
+        .add_headers('client_id', 'client_secret', 2)
+        .login('username', 'password')
+
+    A token is reused until refresh_margin secs before its expires_in. After that it is refreshed with
+    its refresh_token when one was issued, else a new password grant is made.
+    With path and secret the cache is persisted to a file encrypted with Fernet, which requires
+    the cryptography package.
+    """
+
+    def __init__(self, refresh_margin=60, path=None, secret=None):
+        self.refresh_margin = refresh_margin
+        self.store = EncryptedJsonFile(path, secret, 'tokens') if path else None
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+        if self.store:
+            self.load()
+
+    @staticmethod
+    def key(iam_url, client_id, username):
+        return '|'.join([iam_url, client_id, username])
+
+    def get(self, key):
+        """Token which is valid for more than refresh_margin secs, else None."""
+        with self.lock:
+            token = self.tokens.get(key)
+        if token is not None and token['expires_at'] - self.refresh_margin > time.time():
+            return token
+        return None
+
+    def refresh_token(self, key):
+        with self.lock:
+            token = self.tokens.get(key)
+        return token.get('refresh_token') if token else None
+
+    def put(self, key, token):
+        token = dict(token, expires_at=time.time() + int(token.get('expires_in', 0)))
+        with self.lock:
+            self.tokens[key] = token
+        self.save()
+        return token
+
+    def invalidate(self, key):
+        with self.lock:
+            self.tokens.pop(key, None)
+        self.save()
+
+    def load(self):
+        tokens = self.store.load() or {}
+        now = time.time()
+        self.tokens = {key: token for key, token in tokens.items()
+                       if token['expires_at'] > now or token.get('refresh_token')}
+
+    def save(self):
+        if not self.store:
+            return
+        with self.lock:
+            tokens = dict(self.tokens)
+        self.store.save(tokens)
+
+
+token_caches = {}
+
+
+def shared_token_cache(path=None, secret=None):
+    """Token cache shared by the clients of the process, one per persistence file."""
+    return shared_by_path(token_caches, path, lambda: TokenCache(path=path, secret=secret))
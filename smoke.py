@@ -6,79 +6,192 @@ Command line script for smoke test deployment
 
 import logging
 import time
+from concurrent.futures import ProcessPoolExecutor
 from sys import exit
 
 from suite.helper import execute_test_cases
-from suite.util import setup_logger, parse_args
+from suite.util import setup_logger, parse_args, print_separator
 
-from auth_client.auth_client_helper import update_client
+from auth_client.auth_client_helper import add_redirect_uris, update_client
 
 import os
+import re
 import yaml
 from vault import vault_api as vs
 
 logger = logging.getLogger('smoke')
 
-# ---- Read arguments and execute deployment ------------
-start = time.time()
-args = parse_args()
-
-with open(args.config) as _f:
-    deploy_config = yaml.safe_load(_f.read())
-
-log_level = deploy_config['smoke_test_log_level']
-setup_logger(logger, log_level)
-
-username = deploy_config['smoke_test_user']
-password = deploy_config['smoke_test_pwd']
-
-admin_user = deploy_config['org_admin_user']
-admin_pwd = deploy_config['org_admin_pwd']
-
-# construct iamss_url from config.
-domain = deploy_config['domain']
-host_name = '-'.join(
-    [deploy_config['host_names']['iam_self_service_name'], str(deploy_config['version']).replace('.', '')])
-if deploy_config['use_blue_green_as_host']:
-    host_name += ''.join(['-', deploy_config['blue_green']])
-authorize_url = ''.join(['https://', host_name, '.', domain])
-# route_url needs to added to the client
-authorize_route_url = ''.join(['https://', deploy_config['route_names']
-                               ['iam_self_service_name'], '.', domain])
-
-page_load_timeout = deploy_config['page_load_timeout']
-redirect_load_timeout = deploy_config['redirect_load_timeout']
 
-deploy_config['username'] = username
-deploy_config['password'] = password
+def load_targets(args):
+    """Load the deployment configuration of every target to smoke test.
+
+    :param args: parsed options, each --config is a target and each entry
+                 of the --matrix targets overrides the matrix base config.
+    :return: list of (target name, deploy_config)
+    """
+    targets = []
+    for config_path in args.config or []:
+        with open(config_path) as _f:
+            targets.append((config_path, yaml.safe_load(_f.read())))
+
+    if args.matrix:
+        with open(args.matrix) as _f:
+            matrix = yaml.safe_load(_f.read())
+        with open(matrix['config']) as _f:
+            base_config = _f.read()
+        for index, overrides in enumerate(matrix['targets']):
+            deploy_config = yaml.safe_load(base_config)
+            deploy_config.update(overrides)
+            targets.append((overrides.get('name', '{}#{}'.format(args.matrix, index)), deploy_config))
+
+    return targets
+
+
+def prepare_target(deploy_config):
+    """Complete the deployment configuration of a target with the credentials and the IAM urls,
+    read from vault when the client secret is not configured.
+
+    :param deploy_config: Deployment configuration of the target
+    :return: (authorize_url, authorize_route_url)
+    """
+    username = deploy_config['smoke_test_user']
+    password = deploy_config['smoke_test_pwd']
+
+    admin_user = deploy_config['org_admin_user']
+    admin_pwd = deploy_config['org_admin_pwd']
+
+    # construct iamss_url from config.
+    domain = deploy_config['domain']
+    host_name = '-'.join(
+        [deploy_config['host_names']['iam_self_service_name'], str(deploy_config['version']).replace('.', '')])
+    if deploy_config['use_blue_green_as_host']:
+        host_name += ''.join(['-', deploy_config['blue_green']])
+    authorize_url = ''.join(['https://', host_name, '.', domain])
+    # route_url needs to added to the client
+    authorize_route_url = ''.join(['https://', deploy_config['route_names']
+                                   ['iam_self_service_name'], '.', domain])
+
+    deploy_config['username'] = username
+    deploy_config['password'] = password
+
+    deploy_config['org_admin_usr'] = admin_user
+    deploy_config['org_admin_pwd'] = admin_pwd
+
+    if not deploy_config['client_secret']:
+        config_yaml = vs.read_app_config(
+            os.environ['CF_USN'], os.environ['CF_PWD'], deploy_config, parse=yaml.safe_load)
+        deploy_config['iam_url'] = config_yaml['iam_url']
+        deploy_config['idm_url'] = config_yaml['idm_url']
+        deploy_config['client_secret'] = config_yaml['client_secret']
+
+    return authorize_url, authorize_route_url
+
+
+def smoke_test(target, deploy_config, separate_results=False, update_clients=True):
+    """Smoke test a target deployment.
+
+    :param target: Name of the target used in the logs
+    :param deploy_config: Deployment configuration of the target
+    :param separate_results: Write the results in a subfolder of smoke_test_result named after the target,
+                             so targets tested at the same time do not overwrite each other's results
+    :param update_clients: Add the redirect uris to the client, False when update_target_clients did
+    :return: exit code, 0 if all test cases passed
+    """
+    start = time.time()
+
+    if separate_results:
+        deploy_config['smoke_test_result'] = os.path.join(deploy_config['smoke_test_result'],
+                                                          re.sub(r'[^\w.-]+', '_', target))
+    os.makedirs(deploy_config['smoke_test_result'], exist_ok=True)
+
+    log_level = deploy_config['smoke_test_log_level']
+    setup_logger(logger, log_level)
+
+    authorize_url, authorize_route_url = prepare_target(deploy_config)
+
+    logger.info('Smoke test started for... %s,'
+                ' page_load_timeout = %d secs,'
+                ' redirect_load_timeout = %d secs, ',
+                authorize_url, deploy_config['page_load_timeout'], deploy_config['redirect_load_timeout'])
+
+    if update_clients:
+        # Update client with the redirect uri.
+        logger.info(
+            'Updating client {} with authorize url {}/authorize from host...'.format(deploy_config['client_id'],
+                                                                                     authorize_url))
+        update_client(authorize_url, deploy_config)
+
+    test_suite = execute_test_cases(authorize_url, deploy_config, log_level)
+
+    # # once the smoke test is done the url can be updated with the route url
+    if update_clients:
+        update_client(authorize_route_url, deploy_config)
+
+    end = time.time()
+    logger.info("Smoke test of %s completed in : %f s", target, round(end - start))
+    return 0 if test_suite.all_passed() else 1
+
+
+def update_target_clients(targets, url_index):
+    """Add a redirect uri of every target to the clients, once per client.
+    Targets tested at the same time often share the client, e.g. the blue and green targets of a matrix,
+    and would overwrite each other's redirect uri when each read and wrote the client itself.
+
+    :param targets: list of (target name, deploy_config, (authorize_url, authorize_route_url))
+    :param url_index: 0 for the authorize urls, 1 for the authorize route urls
+    """
+    clients = {}
+    for target, deploy_config, urls in targets:
+        key = (deploy_config['idm_url'], deploy_config['client_id'])
+        clients.setdefault(key, (deploy_config, []))[1].append(urls[url_index])
+    for (idm_url, client_id), (deploy_config, authorize_urls) in clients.items():
+        logger.info('Updating client %s with authorize urls %s...', client_id, ', '.join(authorize_urls))
+        add_redirect_uris(authorize_urls, deploy_config)
+
+
+def run_target(target, deploy_config):
+    """Smoke test a target in a worker process, a failure of one target does not stop the others.
+    The clients are updated by the parent process, see update_target_clients.
+    :return: (target name, exit code, duration in secs)
+    """
+    start = time.time()
+    try:
+        exit_code = smoke_test(target, deploy_config, separate_results=True, update_clients=False)
+    except Exception as error:
+        logger.exception('Smoke test of %s failed: %s', target, error)
+        exit_code = 2
+    return target, exit_code, time.time() - start
+
+
+def print_targets_summary(results):
+    logger.info('\n'.join(['', ' '.join([print_separator('#'), 'TARGETS SUMMARY', print_separator('#')]),
+                           '\t\t'.join(['TARGET', 'EXIT CODE', 'DURATION']),
+                           print_separator('=')] +
+                          [' '.join([target, str(exit_code), '{:.0f} s'.format(duration)])
+                           for target, exit_code, duration in results] +
+                          [print_separator('='),
+                           'TOTAL TARGETS: {}'.format(len(results)),
+                           'TOTAL TARGETS PASSED: {}'.format(len([r for r in results if r[1] == 0])),
+                           'TOTAL TARGETS FAILED: {}'.format(len([r for r in results if r[1] != 0]))]))
 
-deploy_config['org_admin_usr'] = admin_user
-deploy_config['org_admin_pwd'] = admin_pwd
 
-logger.info('Smoke test started for... %s,'
-            ' page_load_timeout = %d secs,'
-            ' redirect_load_timeout = %d secs, ',
-            authorize_url, page_load_timeout, redirect_load_timeout)
-
-# Update client with the redirect uri.
-logger.info(
-    'Updating client {} with authorize url {}/authorize from host...'.format(deploy_config['client_id'], authorize_url))
-
-if not deploy_config['client_secret']:
-    vault_data = vs.read_app_config(
-        os.environ['CF_USN'], os.environ['CF_PWD'], deploy_config).decode('ascii')
-    config_yaml = yaml.safe_load(vault_data)
-    deploy_config['iam_url'] = config_yaml['iam_url']
-    deploy_config['idm_url'] = config_yaml['idm_url']
-    deploy_config['client_secret'] = config_yaml['client_secret']
-
-update_client(authorize_url, deploy_config)
-
-execute_test_cases(authorize_url, deploy_config, log_level)
-
-# # once the smoke test is done the url can be updated with the route url
-update_client(authorize_route_url, deploy_config)
-
-end = time.time()
-logger.info("Smoke test completed in : %f s", round(end - start))
-exit(0)
+# ---- Read arguments and execute deployment ------------
+if __name__ == '__main__':
+    args = parse_args()
+    targets = load_targets(args)
+
+    if len(targets) == 1:
+        exit(smoke_test(*targets[0]))
+
+    setup_logger(logger, targets[0][1]['smoke_test_log_level'])
+    logger.info('Smoke test started for %d targets on %d workers.', len(targets), args.workers)
+    prepared = [(target, deploy_config, prepare_target(deploy_config)) for target, deploy_config in targets]
+    update_target_clients(prepared, 0)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(run_target, target, deploy_config) for target, deploy_config in targets]
+        results = [future.result() for future in futures]
+    # once the smoke tests are done the urls can be updated with the route urls
+    update_target_clients(prepared, 1)
+
+    print_targets_summary(results)
+    exit(max(exit_code for target, exit_code, duration in results))
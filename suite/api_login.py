@@ -0,0 +1,75 @@
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from auth_client.session import HttpSession
+
+logger = logging.getLogger('api_login')
+
+SESSION_COOKIE = 'iPlanetDirectoryPro'
+
+
+class ApiLogin:
+    """
+    Log a user in over the ForgeRock /json/authenticate REST endpoint instead of the login page,
+    for test cases which only need an authenticated browser.
+    Usage:
+
+    api_login = ApiLogin({'authenticate_url': 'https://am/json/realms/root/authenticate'})
+    driver.add_cookies(api_login.cookies('user', 'password'))
+
+    The returned cookies are injected into the browser before navigating, the authorize redirect of
+    the application then completes without showing the login page.
+    """
+
+    def __init__(self, options):
+        """
+        :param options: smoke_test_api_login of the deploy config:
+                        authenticate_url, cookie_name (default iPlanetDirectoryPro),
+                        cookie_domain (default the host of authenticate_url)
+        """
+        self.authenticate_url = options['authenticate_url']
+        self.cookie_name = options.get('cookie_name', SESSION_COOKIE)
+        self.cookie_domain = options.get('cookie_domain', urlsplit(self.authenticate_url).hostname)
+        self.session = HttpSession(retries=1)
+        self.lock = threading.Lock()
+
+    def cookies(self, username, password):
+        """Authenticate the user.
+        :return: [{'name', 'value', 'domain', 'path', 'secure', 'httpOnly'}] cookies of the session
+        :raises AssertionError: If the authentication is rejected
+        """
+        # The session cookies of one user must not be sent with the authentication of the next one.
+        with self.lock:
+            response = self.session.post(self.authenticate_url,
+                                         headers={'X-OpenAM-Username': username,
+                                                  'X-OpenAM-Password': password,
+                                                  'Content-Type': 'application/json',
+                                                  'Accept-API-Version': 'resource=2.0, protocol=1.0'},
+                                         data='{}')
+            self.session.session.cookies.clear()
+
+        assert response.status_code == 200, 'API login of {} failed: {} {}'.format(
+            username, response.status_code, response.text)
+        token_id = response.json()['tokenId']
+        logger.debug('API login of %s successful.', username)
+
+        cookies = {cookie.name: cookie for cookie in response.cookies}
+        secure = urlsplit(self.authenticate_url).scheme == 'https'
+        session_cookies = [{'name': self.cookie_name, 'value': token_id, 'domain': self.cookie_domain,
+                            'path': '/', 'secure': secure, 'httpOnly': True}]
+        session_cookies.extend({'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain,
+                                'path': cookie.path or '/', 'secure': bool(cookie.secure), 'httpOnly': True}
+                               for name, cookie in cookies.items() if name != self.cookie_name)
+        return session_cookies
+
+
+api_logins = {}
+
+
+def shared_api_login(options):
+    """API login shared by the test cases of the process, one per authenticate_url."""
+    api_login = api_logins.get(options['authenticate_url'])
+    if api_login is None:
+        api_login = api_logins.setdefault(options['authenticate_url'], ApiLogin(options))
+    return api_login
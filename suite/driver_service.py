@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+"""
+Long lived local driver service which keeps warm, pre-configured Chrome sessions for smoke runs.
+Usage:
+python -m suite.driver_service -c configurations/custom/deployment_config.yml
+python -m suite.driver_service -m configurations/custom/matrix.yml
+
+The service starts chromedriver, opens smoke_test_driver_sessions browser sessions and lists the idle
+ones in the state file smoke_test_driver_service. A Driver configured with the same state file leases
+an idle session, resets its state and hands it back on quit. A session is recycled after
+smoke_test_driver_max_uses leases and replaced by a fresh one in the background.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import signal
+import time
+from contextlib import contextmanager
+
+import yaml
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+
+from suite.util import setup_logger, parse_args
+
+logger = logging.getLogger('driver_service')
+
+DEFAULT_SESSIONS = 2
+DEFAULT_MAX_USES = 10
+
+
+def chrome_options(log_level):
+    """Chrome options shared by local drivers and the sessions of the driver service."""
+    options = Options()
+    options.add_argument('--no-sandbox')
+    options.add_argument('--headless')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--log-level={}'.format(log_level))
+    return options
+
+
+class AttachedDriver(RemoteWebDriver):
+    """Remote web driver attached to an existing chromedriver session instead of starting a new one."""
+    def __init__(self, url, session_id):
+        self.attach_session_id = session_id
+        super().__init__(command_executor=url, desired_capabilities={})
+        self.command_executor._commands['executeCdpCommand'] = ('POST', '/session/$sessionId/goog/cdp/execute')
+
+    def start_session(self, capabilities, browser_profile=None):
+        self.session_id = self.attach_session_id
+        self.w3c = True
+        self.command_executor.w3c = True
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        return self.execute('executeCdpCommand', {'cmd': cmd, 'params': cmd_args})['value']
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def locked_state(state_file):
+    """Read the state file under an exclusive lock and write it back when the block completes."""
+    with open(state_file + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(state_file) as _f:
+                state = json.load(_f)
+            yield state
+            with open(state_file + '.tmp', 'w') as _f:
+                json.dump(state, _f)
+            os.replace(state_file + '.tmp', state_file)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def lease_session(state_file):
+    """Lease an idle session from the driver service.
+    :param state_file: State file of the driver service
+    :return: lease with url, session_id and uses, None if the service is not running or has no idle session
+    """
+    try:
+        with locked_state(state_file) as state:
+            if not pid_alive(state['pid']) or not state['idle']:
+                return None
+            lease = state['idle'].pop()
+            lease['uses'] += 1
+            lease['pid'] = os.getpid()
+            state['leased'][lease['session_id']] = lease
+            return dict(lease, url=state['url'])
+    except FileNotFoundError:
+        return None
+
+
+def release_session(state_file, lease, retire=False):
+    """Hand a leased session back to the driver service.
+    :param state_file: State file of the driver service
+    :param lease: Lease returned by lease_session
+    :param retire: Recycle the session even if it has uses left, e.g. after a timeout
+    :return: True if handed back, False if the service is no longer running
+    """
+    try:
+        with locked_state(state_file) as state:
+            state['leased'].pop(lease['session_id'], None)
+            if retire or lease['uses'] >= state['max_uses']:
+                state['retired'].append(lease['session_id'])
+            else:
+                state['idle'].append({'session_id': lease['session_id'], 'uses': lease['uses']})
+    except FileNotFoundError:
+        return False
+    return True
+
+
+class DriverService:
+    def __init__(self, path, state_file, sessions, max_uses, log_level):
+        """
+        Initialize the driver service.
+        :param path: Path to chromedriver
+        :param state_file: State file shared with the drivers
+        :param sessions: Number of warm sessions to keep
+        :param max_uses: Number of leases after which a session is recycled
+        :param log_level:
+        """
+        self.state_file = state_file
+        self.sessions = sessions
+        self.max_uses = max_uses
+        self.options = chrome_options(log_level)
+        self.service = Service(path)
+        self.url = None
+        self.running = False
+
+    def start(self):
+        self.service.start()
+        self.url = self.service.service_url
+        with open(self.state_file, 'w') as _f:
+            json.dump({'url': self.url, 'pid': os.getpid(), 'max_uses': self.max_uses,
+                       'idle': [], 'leased': {}, 'retired': []}, _f)
+        logger.info('Driver service started at %s, state file %s', self.url, self.state_file)
+        return self
+
+    def new_session(self):
+        web_driver = RemoteWebDriver(command_executor=self.url,
+                                     desired_capabilities=self.options.to_capabilities())
+        web_driver.maximize_window()
+        logger.debug('Session %s started.', web_driver.session_id)
+        return web_driver.session_id
+
+    def quit_session(self, session_id):
+        try:
+            AttachedDriver(self.url, session_id).quit()
+            logger.debug('Session %s recycled.', session_id)
+        except Exception as error:
+            logger.warning('Failed to quit session %s: %s', session_id, error)
+
+    def maintain(self):
+        """Recycle retired sessions and sessions leased by dead processes, then top up the idle sessions."""
+        with locked_state(self.state_file) as state:
+            retired = state['retired']
+            state['retired'] = []
+            for session_id, lease in list(state['leased'].items()):
+                if not pid_alive(lease['pid']):
+                    retired.append(state['leased'].pop(session_id)['session_id'])
+            missing = self.sessions - len(state['idle']) - len(state['leased'])
+
+        for session_id in retired:
+            self.quit_session(session_id)
+
+        started = [{'session_id': self.new_session(), 'uses': 0} for _ in range(max(missing, 0))]
+        if started:
+            with locked_state(self.state_file) as state:
+                state['idle'].extend(started)
+
+    def serve_forever(self, interval=1):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.shutdown)
+        signal.signal(signal.SIGINT, self.shutdown)
+        while self.running:
+            self.maintain()
+            time.sleep(interval)
+        self.stop()
+
+    def shutdown(self, signum=None, frame=None):
+        self.running = False
+
+    def stop(self):
+        with locked_state(self.state_file) as state:
+            sessions = [lease['session_id'] for lease in state['idle']] + list(state['leased']) + state['retired']
+            state['idle'], state['leased'], state['retired'] = [], {}, []
+        for session_id in sessions:
+            self.quit_session(session_id)
+        os.remove(self.state_file)
+        self.service.stop()
+        logger.info('Driver service stopped.')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    # The sessions of a matrix share the driver settings of its base configuration.
+    config_path = args.config[0] if args.config else None
+    if config_path is None:
+        with open(args.matrix) as _f:
+            config_path = yaml.safe_load(_f.read())['config']
+    with open(config_path) as _f:
+        deploy_config = yaml.safe_load(_f.read())
+
+    log_level = deploy_config['smoke_test_log_level']
+    setup_logger(logger, log_level)
+
+    DriverService(deploy_config['smoke_test_driver'],
+                  deploy_config['smoke_test_driver_service'],
+                  deploy_config.get('smoke_test_driver_sessions', DEFAULT_SESSIONS),
+                  deploy_config.get('smoke_test_driver_max_uses', DEFAULT_MAX_USES),
+                  log_level).start().serve_forever()
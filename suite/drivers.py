@@ -1,44 +1,170 @@
 
 import logging
+import threading
+from contextlib import contextmanager
+from queue import Queue
+from urllib.parse import urlsplit
+
 from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
 
+from suite.driver_service import AttachedDriver, chrome_options, lease_session, release_session
+from suite.screenshots import ScreenshotPolicy, writer
+from suite.timing import traced
 from suite.util import setup_logger
 
 logger = logging.getLogger('chrome_driver')
 
+POLL_FREQUENCY = 0.25
+# Implicit wait in secs per lookup policy, overridden by smoke_test_lookup_timeouts in deploy config.
+# 'default' applies to every lookup, 'probe' to lookups of optional elements.
+LOOKUP_TIMEOUTS = {
+    'default': 30,
+    'probe': 2
+}
+XPATH_PRESENT_SCRIPT = (
+    'return document.evaluate(arguments[0], document, null, '
+    'XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue !== null;')
+
+QUERY_SCRIPT = """
+var locators = arguments[0], snapshot = {};
+for (var name in locators) {
+    var locator = locators[name], element;
+    if (locator.by === 'id') {
+        element = document.getElementById(locator.value);
+    } else if (locator.by === 'css') {
+        element = document.querySelector(locator.value);
+    } else {
+        element = document.evaluate(locator.value, document, null,
+                                    XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    if (element === null) {
+        snapshot[name] = null;
+    } else if (locator.attribute === 'text') {
+        snapshot[name] = element.innerText;
+    } else if (locator.attribute === 'present') {
+        snapshot[name] = true;
+    } else {
+        snapshot[name] = element.getAttribute(locator.attribute);
+    }
+}
+return snapshot;
+"""
+
+
+def query_script_args(locators):
+    """Convert {name: (by, value[, attribute])} locators, by is id, css or xpath and
+    attribute is text (default), present or an attribute name, to the QUERY_SCRIPT argument."""
+    return {name: {'by': locator[0], 'value': locator[1], 'attribute': locator[2] if len(locator) > 2 else 'text'}
+            for name, locator in locators.items()}
+
+
+def origin(url):
+    parts = urlsplit(url)
+    return '{}://{}'.format(parts.scheme, parts.netloc)
+
+
+def page_loaded(web_driver):
+    """Readiness condition: document.readyState is complete."""
+    return web_driver.execute_script('return document.readyState') == 'complete'
+
+
+def element_present(xpath):
+    """Readiness condition: an element matching the xpath is in the DOM.
+    Evaluated in the page, so it does not block on the implicit wait.
+    """
+    def condition(web_driver):
+        return web_driver.execute_script(XPATH_PRESENT_SCRIPT, xpath)
+    return condition
+
+
+def url_changed(url):
+    """Readiness condition: the browser navigated away from the url."""
+    def condition(web_driver):
+        return web_driver.current_url != url
+    return condition
+
+
+def url_starts_with(url):
+    """Readiness condition: the browser is on a page under the url."""
+    def condition(web_driver):
+        return web_driver.current_url.startswith(url)
+    return condition
+
+
+def query_ready(locators, required):
+    """Readiness condition: the batched query finds the required locator, the snapshot is the condition value."""
+    script_args = query_script_args(locators)
+
+    def condition(web_driver):
+        snapshot = web_driver.execute_script(QUERY_SCRIPT, script_args)
+        return snapshot if snapshot.get(required) is not None else False
+    return condition
+
+
+def any_of(*conditions):
+    """Readiness condition: at least one of the conditions holds."""
+    def condition(web_driver):
+        return any(check(web_driver) for check in conditions)
+    return condition
+
 
 class Driver:
-    def __init__(self, path, page_load_timeout, result_folder, log_level):
+    def __init__(self, path, page_load_timeout, result_folder, log_level, lookup_timeouts=None,
+                 service_state=None, screenshots=None):
         """
         Default Constructor
+        :param service_state: State file of a running suite.driver_service, a warm session is leased
+                              from the service when one is idle instead of starting Chrome.
+        :param screenshots: Screenshot capture policy, see suite.screenshots.ScreenshotPolicy
         """
         self.result_folder = result_folder
-        chrome_options = Options()
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--disable-extensions')
-        chrome_options.add_argument('--log-level={}'.format(log_level))
 
         setup_logger(logger, log_level)
 
         self.web_driver = None
+        self.implicit_wait = None
+        self.lease = None
         self.path = path
-        self.chrome_options = chrome_options
+        self.chrome_options = chrome_options(log_level)
         self.page_load_timeout = page_load_timeout
+        self.lookup_timeouts = dict(LOOKUP_TIMEOUTS, **(lookup_timeouts or {}))
+        self.service_state = service_state
+        self.origins = set()
+        self.screenshot_policy = ScreenshotPolicy(screenshots)
 
         self.init_driver()
 
     def init_driver(self):
-        self.web_driver = webdriver.Chrome(self.path, options=self.chrome_options)
-        self.web_driver.maximize_window()
-        self.web_driver.implicitly_wait(30)
+        if self.web_driver is not None:
+            self.discard()
+            self.web_driver = None
+
+        if self.service_state:
+            self.lease = lease_session(self.service_state)
+
+        if self.lease is not None:
+            try:
+                self.web_driver = AttachedDriver(self.lease['url'], self.lease['session_id'])
+                self.reset()
+                logger.debug('Attached to warm session %s, use #%d', self.lease['session_id'], self.lease['uses'])
+            except WebDriverException as error:
+                logger.warning('Warm session %s is not usable, starting Chrome: %s', self.lease['session_id'], error)
+                self.release(retire=True)
+
+        if self.lease is None:
+            self.web_driver = webdriver.Chrome(self.path, options=self.chrome_options)
+            self.web_driver.maximize_window()
+        self.implicit_wait = self.lookup_timeouts['default']
+        self.web_driver.implicitly_wait(self.implicit_wait)
         self.web_driver.set_page_load_timeout(self.page_load_timeout)
 
+    @traced
     def get(self, url, retry):
+        self.origins.add(origin(url))
         while True:
             try:
                 retry -= 1
@@ -53,21 +179,162 @@ class Driver:
                 continue
         return retry
 
+    @traced
     def title(self):
         return self.web_driver.title
 
+    def current_url(self):
+        """Current URL, its origin is recorded so reset() also clears the storage of origins reached by redirect."""
+        url = self.web_driver.current_url
+        if url.startswith('http'):
+            self.origins.add(origin(url))
+        return url
+
+    @traced
+    def wait_until(self, condition, timeout):
+        """
+        Wait until the condition holds, polling every POLL_FREQUENCY secs.
+        Errors raised while the page is navigating are ignored until the timeout.
+        :param condition: Callable taking the selenium web driver, e.g. page_loaded
+        :param timeout: Upper bound in secs
+        :return: Value returned by the condition
+        :raises TimeoutException: If the condition does not hold within the timeout
+        """
+        return WebDriverWait(self.web_driver, timeout, poll_frequency=POLL_FREQUENCY,
+                             ignored_exceptions=(WebDriverException,)).until(condition)
+
+    @traced
+    def reset(self):
+        """Drop the session state left by a previous user of the driver: extra tabs, cookies and storage."""
+        for handle in self.web_driver.window_handles[1:]:
+            self.web_driver.switch_to.window(handle)
+            self.web_driver.close()
+        self.web_driver.switch_to.window(self.web_driver.window_handles[0])
+
+        current_origin = origin(self.web_driver.current_url)
+        if current_origin.startswith('http'):
+            self.origins.add(current_origin)
+
+        self.web_driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        for visited in self.origins:
+            self.web_driver.execute_cdp_cmd('Storage.clearDataForOrigin',
+                                            {'origin': visited, 'storageTypes': 'all'})
+        self.origins.clear()
+        self.web_driver.get('about:blank')
+
+    @traced
+    def add_cookies(self, cookies):
+        """Set cookies in the browser without navigating to their domain first, e.g. the session of an API login.
+        :param cookies: [{'name', 'value', 'domain', 'path', 'secure', 'httpOnly'}]
+        """
+        for cookie in cookies:
+            self.web_driver.execute_cdp_cmd('Network.setCookie', cookie)
+            self.origins.add('{}://{}'.format('https' if cookie.get('secure') else 'http',
+                                              cookie['domain'].lstrip('.')))
+
+    def discard(self):
+        """Quit the browser, or recycle the leased session, after it failed."""
+        self.release(retire=True)
+
     def quit(self):
-        self.web_driver.quit()
+        writer.flush()
+        if self.lease is None:
+            self.web_driver.quit()
+            return
 
+        try:
+            self.reset()
+        except WebDriverException as error:
+            logger.warning('Failed to reset session %s, recycle it: %s', self.lease['session_id'], error)
+            self.release(retire=True)
+            return
+        self.release()
+
+    def release(self, retire=False):
+        if self.lease is not None and release_session(self.service_state, self.lease, retire):
+            self.lease = None
+            return
+
+        self.lease = None
+        if self.web_driver is None:
+            return
+        try:
+            self.web_driver.quit()
+        except WebDriverException as error:
+            logger.warning('Failed to quit the driver: %s', error)
+
+    @traced
     def find_element_by_id(self, id):
         return self.web_driver.find_element_by_id(id)
 
+    @traced
     def find_element_by_link_text(self, text):
         return self.web_driver.find_element_by_link_text(text)
 
+    @traced
     def find_element_by_xpath(self, xpath):
         return self.web_driver.find_element_by_xpath(xpath)
 
+    def lookup_timeout(self, policy):
+        return self.lookup_timeouts.get(policy, self.lookup_timeouts['default'])
+
+    @contextmanager
+    def lookup_policy(self, policy):
+        """
+        Use the implicit wait of the lookup policy for the lookups made in the block.
+        Usage:
+        with driver.lookup_policy('probe'):
+            driver.find_element_by_id('optional')
+        """
+        previous = self.implicit_wait
+        self.set_implicit_wait(self.lookup_timeout(policy))
+        try:
+            yield self
+        finally:
+            self.set_implicit_wait(previous)
+
+    def set_implicit_wait(self, timeout):
+        self.implicit_wait = timeout
+        self.web_driver.implicitly_wait(timeout)
+
+    @traced
+    def find_element_if_present(self, xpath, timeout=None):
+        """
+        Probe for an optional element without inheriting the implicit wait.
+        :param xpath: Find by xpath
+        :param timeout: Secs to wait for the element, defaults to the 'probe' lookup policy, 0 checks once
+        :return: The element or None if it is not present within the timeout
+        """
+        if timeout is None:
+            timeout = self.lookup_timeout('probe')
+        self.web_driver.implicitly_wait(0)
+        try:
+            if timeout <= 0:
+                elements = self.web_driver.find_elements_by_xpath(xpath)
+                return elements[0] if elements else None
+            return WebDriverWait(self.web_driver, timeout, poll_frequency=POLL_FREQUENCY).until(
+                expected_conditions.presence_of_element_located((By.XPATH, xpath)))
+        except TimeoutException:
+            logger.debug('Element %s not present after %s secs', xpath, timeout)
+            return None
+        finally:
+            self.web_driver.implicitly_wait(self.implicit_wait)
+
+    @traced
+    def query(self, locators):
+        """
+        Resolve a set of locators in a single script round trip.
+        Usage:
+        driver.query({'navbar': ('id', 'responsive-navbar-nav'),
+                      'logout': ('xpath', '//*[@id="logout"]', 'present'),
+                      'avatar': ('css', 'img.avatar', 'src')})
+        :param locators: {name: (by, value[, attribute])}, by is id, css or xpath,
+                         attribute is text (default), present or an attribute name
+        :return: snapshot {name: value}, None for the locators not found
+        """
+        return self.web_driver.execute_script(QUERY_SCRIPT, query_script_args(locators))
+
+    @traced
     def send_keys(self, key, value):
         """
         Send keys to the input text box.
@@ -77,8 +344,66 @@ class Driver:
         """
         self.find_element_by_xpath(key).send_keys(value)
 
+    @traced
     def find_element_by_class_name(self, name):
         return self.web_driver.find_element_by_class_name(name)
 
-    def save_screenshot(self, filename):
-        self.web_driver.save_screenshot(''.join([self.result_folder, '/', filename, '.png']))
+    @traced
+    def save_screenshot(self, filename, force=False):
+        """
+        Capture a screenshot if the screenshot policy allows, it is written to the result folder in background.
+        :param filename: File name without the .png extension
+        :param force: Capture regardless of the policy, e.g. for a failed test case
+        :return:
+        """
+        if not force and not self.screenshot_policy.capture():
+            return
+        writer.submit(''.join([self.result_folder, '/', filename, '.png']), self.web_driver.get_screenshot_as_png())
+
+
+class DriverPool:
+    """Bounded pool of Driver instances shared by parallel test case workers.
+    Usage:
+    pool = DriverPool(size, lambda: Driver(...))
+    with pool.acquire() as driver:
+        driver.get(url, retry)
+
+    Drivers are created lazily, at most `size` of them, and handed back to the pool on release.
+    """
+    def __init__(self, size, factory, drivers=None):
+        self.size = size
+        self.factory = factory
+        self.idle = Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+        for driver in drivers or []:
+            self.created += 1
+            self.idle.put(driver)
+
+    @contextmanager
+    def acquire(self):
+        driver = self._take()
+        try:
+            yield driver
+        finally:
+            self.idle.put(driver)
+
+    def _take(self):
+        with self.lock:
+            create = self.idle.empty() and self.created < self.size
+            if create:
+                self.created += 1
+        if not create:
+            return self.idle.get()
+
+        logger.debug('Creating pooled driver #%d', self.created)
+        try:
+            return self.factory()
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    def quit(self):
+        while not self.idle.empty():
+            self.idle.get().quit()
@@ -13,28 +13,33 @@ logger = logging.getLogger('execution')
 
 def execute_test_cases(iamss_url, deploy_config, log_level):
     """Execute tests with the following steps:
-        1. Start a timer (datetime.utcnow())
+        1. Start a timing span (monotonic clock)
         2. Execute a test case
             Open a page
             Assert the content
-        3. End the timer
-        4. Record Response Time (endTime - startTime)
+        3. End the timing span
+        4. Record Response Time (span duration)
         5. Record execution time (endTime)
         6. Execution status (pass / fail)
         7. Execution end point
+        8. Stream the result to results.jsonl and junit.xml in smoke_test_result
 
     :param iamss_url:
     :param deploy_config:
     :param log_level:
-    :return:
+    :return: executed test suite
     """
 
     test_suite = TestSuite().initialize(iamss_url, deploy_config, log_level)
-    test_suite.add_test_case(LandingPage(test_suite))
-    test_suite.add_test_case(LoginPage(test_suite))
-    test_suite.add_test_case(EnvInfo(test_suite))
-    test_suite.add_test_case(OrgAdminInfo(test_suite))
-
-    test_suite.execute_all()
-
-    test_suite.print_final_execution_summary()
+    try:
+        test_suite.add_test_case(LandingPage(test_suite))
+        test_suite.add_test_case(LoginPage(test_suite))
+        test_suite.add_test_case(EnvInfo(test_suite))
+        test_suite.add_test_case(OrgAdminInfo(test_suite))
+
+        test_suite.execute_all()
+    finally:
+        # Closes junit.xml and quits or releases the drivers, also when the execution raised.
+        test_suite.print_final_execution_summary()
+
+    return test_suite
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""
+Append-only history of smoke test response times with percentile trends and regression detection.
+Usage:
+python -m suite.history --history smoke_history.db --threshold 0.2
+
+Runs are appended by TestSuite when smoke_test_history is set in deploy config. The report prints
+p50/p95/p99 per test case and release, and flags releases whose p95 regressed beyond the threshold
+compared to the previous release. The exit code is 1 when the latest release of a test case regressed.
+"""
+
+import argparse
+import math
+import sqlite3
+import sys
+from collections import OrderedDict
+
+from suite.util import print_separator
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    application TEXT NOT NULL,
+    release TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    region TEXT NOT NULL,
+    test_case TEXT NOT NULL,
+    status TEXT NOT NULL,
+    end_time REAL NOT NULL,
+    duration_ms REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_series ON results (application, environment, region, test_case, end_time);
+'''
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of sorted values."""
+    rank = max(math.ceil(percent / 100.0 * len(values)) - 1, 0)
+    return values[rank]
+
+
+class HistoryStore:
+    def __init__(self, path):
+        """
+        Open or create the history database.
+        :param path: SQLite database file
+        """
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.executescript(SCHEMA)
+
+    def append(self, context, results):
+        """Append the results of a run.
+        :param context: application, release, environment and region of the run
+        :param results: TestResult list
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(context['application'], context['release'], context['environment'], context['region'],
+                  result.name, result.status, result.end_time, result.duration_ms) for result in results])
+
+    def trends(self, application=None, environment=None):
+        """Response time percentiles of passed test cases, per series and release in release order.
+        :return: {(application, environment, region, test_case): [(release, runs, p50, p95, p99)]}
+        """
+        query = ('SELECT application, environment, region, test_case, release, duration_ms FROM results '
+                 'WHERE status = ? AND application = COALESCE(?, application) '
+                 'AND environment = COALESCE(?, environment) ORDER BY end_time')
+        series = OrderedDict()
+        for app, env, region, test_case, release, duration_ms in self.connection.execute(
+                query, ('PASSED', application, environment)):
+            series.setdefault((app, env, region, test_case), OrderedDict()).setdefault(release, []).append(
+                duration_ms)
+
+        trends = OrderedDict()
+        for key, releases in series.items():
+            trends[key] = []
+            for release, durations in releases.items():
+                durations.sort()
+                trends[key].append((release, len(durations), percentile(durations, 50),
+                                    percentile(durations, 95), percentile(durations, 99)))
+        return trends
+
+    def report(self, threshold, application=None, environment=None):
+        """
+        :param threshold: Relative p95 increase over the previous release flagged as regression, e.g. 0.2
+        :return: report text, True if the latest release of a series regressed
+        """
+        lines = [' '.join([print_separator('#'), 'RESPONSE TIME HISTORY', print_separator('#')])]
+        latest_regressed = False
+        for (app, env, region, test_case), releases in self.trends(application, environment).items():
+            lines.append('{} {} {} {}'.format(app, env, region, test_case))
+            lines.append('\t\t'.join(['RELEASE', 'RUNS', 'P50', 'P95', 'P99', '']))
+            previous_p95 = None
+            for index, (release, runs, p50, p95, p99) in enumerate(releases):
+                regressed = previous_p95 is not None and p95 > previous_p95 * (1 + threshold)
+                lines.append('{} {} {:.0f} ms {:.0f} ms {:.0f} ms {}'.format(
+                    release, runs, p50, p95, p99, 'REGRESSED' if regressed else ''))
+                if regressed and index == len(releases) - 1:
+                    latest_regressed = True
+                previous_p95 = p95
+            lines.append(print_separator('='))
+        return '\n'.join(lines), latest_regressed
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--history', dest='history', required=True, action='store',
+                        help='Path to the history database, smoke_test_history in deploy config.')
+    parser.add_argument('--threshold', dest='threshold', type=float, default=0.2, action='store',
+                        help='Relative p95 increase over the previous release flagged as regression.')
+    parser.add_argument('--application', dest='application', action='store')
+    parser.add_argument('--environment', dest='environment', action='store')
+    args = parser.parse_args()
+
+    store = HistoryStore(args.history)
+    report, regressed = store.report(args.threshold, args.application, args.environment)
+    store.close()
+    print(report)
+    sys.exit(1 if regressed else 0)
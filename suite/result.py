@@ -0,0 +1,83 @@
+
+import json
+import os
+import threading
+from datetime import datetime
+from xml.sax.saxutils import quoteattr
+
+PASSED = 'PASSED'
+FAILED = 'FAILED'
+ERROR = 'ERROR'
+
+
+class TestResult:
+    """Result of one executed test case, durations are numeric milliseconds and end_time is epoch secs."""
+    __slots__ = ('name', 'status', 'end_time', 'duration_ms', 'end_point', 'message', 'steps')
+
+    def __init__(self, name, status, end_time, duration_ms, end_point, message=None, steps=()):
+        self.name = name
+        self.status = status
+        self.end_time = end_time
+        self.duration_ms = duration_ms
+        self.end_point = end_point
+        self.message = message
+        self.steps = steps
+
+    @property
+    def passed(self):
+        return self.status == PASSED
+
+    def end_timestamp(self):
+        return str(datetime.utcfromtimestamp(self.end_time))
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'status': self.status,
+            'end_time': self.end_time,
+            'duration_ms': self.duration_ms,
+            'end_point': self.end_point,
+            'message': self.message,
+            'steps': [{'name': name, 'duration_ms': duration_ms, 'count': count}
+                      for name, duration_ms, count in self.steps]
+        }
+
+
+class ResultStream:
+    """Stream results as each test case finishes:
+    appended to results.jsonl, one JSON object per line, and written as test cases of junit.xml.
+
+    context is added to every JSONL record, e.g. application, release, environment and region.
+    """
+    def __init__(self, result_folder, suite_name, context):
+        self.context = context
+        self.lock = threading.Lock()
+        self.jsonl = open(os.path.join(result_folder, 'results.jsonl'), 'a')
+        self.junit = open(os.path.join(result_folder, 'junit.xml'), 'w')
+        self.junit.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuite name={}>\n'.format(
+            quoteattr(suite_name)))
+        self.junit.flush()
+
+    def write(self, result):
+        record = dict(self.context, **result.to_dict())
+        testcase = '  <testcase classname={} name={} time="{:.3f}"'.format(
+            quoteattr(self.context.get('application', '')), quoteattr(result.name), result.duration_ms / 1000)
+        if result.passed:
+            testcase += '/>\n'
+        else:
+            element = 'error' if result.status == ERROR else 'failure'
+            testcase += '>\n    <{} message={}/>\n  </testcase>\n'.format(element, quoteattr(result.message or ''))
+
+        with self.lock:
+            self.jsonl.write(json.dumps(record) + '\n')
+            self.jsonl.flush()
+            self.junit.write(testcase)
+            self.junit.flush()
+
+    def close(self):
+        with self.lock:
+            if self.jsonl.closed:
+                return
+            self.jsonl.close()
+            self.junit.write('</testsuite>\n')
+            self.junit.close()
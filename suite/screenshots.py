@@ -0,0 +1,70 @@
+
+import logging
+import random
+import threading
+from queue import Queue
+
+logger = logging.getLogger('screenshots')
+
+ALWAYS = 'always'
+ON_FAILURE = 'on_failure'
+SAMPLED = 'sampled'
+
+
+class ScreenshotPolicy:
+    """Decide which screenshots are captured, configured with smoke_test_screenshots in deploy config.
+    Usage:
+    ScreenshotPolicy({'policy': 'sampled', 'sample_rate': 0.2}).capture()
+
+    always: every screenshot is captured.
+    on_failure: only screenshots of failed test cases are captured.
+    sampled: screenshots are captured with the probability sample_rate.
+    """
+    def __init__(self, config=None):
+        config = config or {}
+        self.policy = config.get('policy', ALWAYS)
+        self.sample_rate = config.get('sample_rate', 0.1)
+        if self.policy not in (ALWAYS, ON_FAILURE, SAMPLED):
+            raise ValueError('Invalid input, smoke_test_screenshots policy {}'.format(self.policy))
+
+    def capture(self):
+        if self.policy == ALWAYS:
+            return True
+        if self.policy == SAMPLED:
+            return random.random() < self.sample_rate
+        return False
+
+
+class ScreenshotWriter:
+    """Write screenshots to disk on a background thread, off the test thread.
+    The queue is bounded so a slow disk applies back pressure instead of holding every PNG in memory.
+    """
+    def __init__(self, max_pending=32):
+        self.queue = Queue(max_pending)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, path, png):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='screenshot-writer', daemon=True)
+                self.thread.start()
+        self.queue.put((path, png))
+
+    def run(self):
+        while True:
+            path, png = self.queue.get()
+            try:
+                with open(path, 'wb') as _f:
+                    _f.write(png)
+            except OSError as error:
+                logger.error('Failed to write screenshot %s: %s', path, error)
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Block until the pending screenshots are written."""
+        self.queue.join()
+
+
+writer = ScreenshotWriter()
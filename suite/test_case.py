@@ -1,9 +1,13 @@
 
-import time
 import logging
-from datetime import datetime
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
 
+from suite.drivers import page_loaded
+from suite.result import TestResult, PASSED, FAILED, ERROR
 from suite.test_suite import TestSuite
+from suite.timing import tracer
 from suite.util import setup_logger
 
 
@@ -15,11 +19,10 @@ class TestCase(TestSuite):
         super().__init__()
         self.web_driver = test_suite.web_driver
         self.config = test_suite.config
-        self.test_passed = test_suite.test_passed
-        self.test_failed = test_suite.test_failed
-        self.test_results = test_suite.test_results
-        self.execution_time = test_suite.execution_time
-        self.response_time = test_suite.response_time
+        self.iamss_url = test_suite.iamss_url
+        self.results = test_suite.results
+        self.result_stream = test_suite.result_stream
+        self.span = None
         self.logger = logging.getLogger(self.name())
         setup_logger(self.logger, self.log_level)
 
@@ -27,19 +30,43 @@ class TestCase(TestSuite):
         super().initialize(url, deploy_config, log_level)
 
     def execute(self):
-        start_time = datetime.utcnow()
+        result = self.run()
+        self.result_stream.write(result)
+        self.record_result(result)
+
+    def run(self):
+        """Run the asserts of the test case without recording the outcome.
+        :return: TestResult
+        """
+        message = None
+        with tracer.span(self.name()) as self.span:
+            try:
+                self.assert_case()
+                status = PASSED
+            except AssertionError as err:
+                self.logger.error('{}'.format(err))
+                status = FAILED
+                message = str(err)
+                self.save_failure_screenshot()
+            except Exception as err:
+                # e.g. NoSuchElementException, the test case errored instead of failing an assert
+                self.logger.exception('{}'.format(err))
+                status = ERROR
+                message = '{}: {}'.format(type(err).__name__, err)
+                self.save_failure_screenshot()
+
+        return TestResult(self.name(), status, time.time(), self.span.duration_ms, self.iamss_url,
+                          message, self.span.breakdown())
+
+    def save_failure_screenshot(self):
+        """Capture the state of a failed test case whatever the screenshot policy."""
         try:
-            self.assert_case()
-            self.test_results.append('PASSED')
-            self.test_passed.append('PASSED')
-            self.test_failed.pop()
-        except AssertionError as err:
-            self.logger.error('{}'.format(err))
-            self.test_results.append('FAILED')
-
-        end_time = datetime.utcnow()
-        self.execution_time.append(str(end_time))
-        self.response_time.append(str(end_time - start_time))
+            self.web_driver.save_screenshot('failed_{}'.format(self.name().replace(' ', '_')), force=True)
+        except WebDriverException as error:
+            self.logger.warning('Failed to capture the failure screenshot: %s', error)
+
+    def record_result(self, result):
+        self.results.append(result)
 
     def assert_case(self):
         """Individual test cases will have asserts
@@ -47,6 +74,14 @@ class TestCase(TestSuite):
         """
         pass
 
+    def step(self, name):
+        """Time a named step of assert_case, shown in the step breakdown of the execution summary.
+        Usage:
+        with self.step('enter credentials'):
+            ...
+        """
+        return tracer.span(name)
+
     def logout(self, user):
         self.logger.info('logging out... %s', user)
         self.web_driver.save_screenshot('logging_out')
@@ -57,11 +92,33 @@ class TestCase(TestSuite):
             '//*[@id="logout_option"]').click()
         self.web_driver.save_screenshot('successful_logout')
 
+    def wait_until(self, condition, timeout, description):
+        """Wait until the readiness condition holds, at most timeout secs.
+        :param condition: Readiness condition from suite.drivers, e.g. element_present(xpath)
+        :param timeout: Upper bound in secs
+        :param description: What is waited for, used in the logs
+        :return: Value of the condition once it holds, False if the wait timed out
+        """
+        self.logger.debug('Waiting at most %d secs for %s', timeout, description)
+        try:
+            value = self.web_driver.wait_until(condition, timeout)
+        except TimeoutException:
+            self.logger.warning('Timed out after %d secs waiting for %s', timeout, description)
+            return False
+        self.logger.debug('Waiting for %s is completed.', description)
+        return value
+
     def wait_timeout(self, timeout):
-        while timeout >= 0:
-            time.sleep(1)
-            self.logger.debug('Waiting for %d secs for page response', timeout)
-            timeout -= 1
+        """Wait until the current page completes loading, at most timeout secs."""
+        return self.wait_until(page_loaded, timeout, 'page response')
+
+    def depends_on(self):
+        """
+        Name of the test case which must run before this one on the same driver session,
+        e.g. a case which needs the user logged in by an earlier case. None if the case is independent.
+        :return:
+        """
+        return None
 
     def name(self):
         """
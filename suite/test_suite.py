@@ -1,8 +1,14 @@
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from suite.util import setup_logger, print_separator
-from suite.drivers import Driver
+from suite.drivers import Driver, DriverPool
+from suite.history import HistoryStore
+from suite.result import ResultStream, FAILED, ERROR
+from suite.timing import tracer
 from config import test_cases
 
 logger = logging.getLogger('test_suite')
@@ -13,16 +19,17 @@ class TestSuite:
         """
         Initialize test suite.
         """
-        self.test_results = []
-        self.execution_time = []
-        self.response_time = []
-        self.test_passed = []
-        self.test_failed = test_cases()
+        self.results = []
+        self.result_stream = None
 
         self.config = None
         self.iamss_url = None
 
         self.web_driver = None
+        self.driver_pool = None
+        self.workers = 1
+        self.lock = threading.Lock()
+        self.closed = False
 
         self.logger = logger
         self.log_level = 'DEBUG'
@@ -37,33 +44,120 @@ class TestSuite:
 
         self.config = deploy_config
         self.iamss_url = url
-
-        self.web_driver = Driver(self.config['smoke_test_driver'],
-                                 self.config['page_load_timeout'],
-                                 self.config['smoke_test_result'],
-                                 self.log_level)
-
-        retry = self.web_driver.get(self.iamss_url, deploy_config['smoke_test_retry'])
+        self.workers = deploy_config.get('smoke_test_workers', 1)
+        self.result_stream = ResultStream(self.config['smoke_test_result'],
+                                          self.config['applications']['iam_self_service_name'],
+                                          self.run_context())
+
+        try:
+            self.web_driver = self.new_driver()
+            retry = self.web_driver.get(self.iamss_url, deploy_config['smoke_test_retry'])
+        except Exception:
+            self.close()
+            raise
 
         if retry <= 0:
             self.print_final_execution_summary()
 
         return self
 
+    def run_context(self):
+        return {
+            'application': self.config['applications']['iam_self_service_name'],
+            'release': str(self.config['version']),
+            'environment': self.config['environment'],
+            'region': self.config['domain']
+        }
+
+    def new_driver(self):
+        return Driver(self.config['smoke_test_driver'],
+                      self.config['page_load_timeout'],
+                      self.config['smoke_test_result'],
+                      self.log_level,
+                      self.config.get('smoke_test_lookup_timeouts'),
+                      self.config.get('smoke_test_driver_service'),
+                      self.config.get('smoke_test_screenshots'))
+
     def add_test_case(self, test_case):
         self.all_tests.append(test_case)
 
     def execute_all(self):
+        if self.closed:
+            # The summary was printed already, e.g. the page did not load.
+            return
+        if self.workers > 1:
+            self.execute_parallel()
+            return
+
         for test in self.all_tests:
             test.execute()
 
+    def execute_parallel(self):
+        """Execute the test cases on `smoke_test_workers` threads, each chain of dependent test cases
+        on a driver taken from a bounded pool. Results are recorded in the order the test cases were added.
+        """
+        chains = self.test_chains()
+        self.logger.info('Executing %d test case chains on %d workers.', len(chains), self.workers)
+        self.driver_pool = DriverPool(self.workers, self.new_driver, [self.web_driver])
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.execute_chain, chain, results) for chain in chains]
+
+        for test in self.all_tests:
+            if test in results:
+                test.record_result(results[test])
+
+        for future in futures:
+            future.result()
+
+    def execute_chain(self, chain, results):
+        with self.driver_pool.acquire() as driver:
+            try:
+                driver.get(self.iamss_url, self.config['smoke_test_retry'])
+                for test in chain:
+                    test.web_driver = driver
+                    result = test.run()
+                    self.result_stream.write(result)
+                    with self.lock:
+                        results[test] = result
+            finally:
+                driver.reset()
+
+    def test_chains(self):
+        """Group the test cases into chains, a test case joins the chain of the test case it depends on.
+        :return: list of chains in the order the test cases were added
+        """
+        chains = []
+        chain_of = {}
+        for test in self.all_tests:
+            chain = chain_of.get(test.depends_on())
+            if chain is None:
+                chain = []
+                chains.append(chain)
+            chain.append(test)
+            chain_of[test.name()] = chain
+        return chains
+
+    def all_passed(self):
+        return len(self.results) == len(self.all_tests) and all(result.passed for result in self.results)
+
     def print_final_execution_summary(self):
+        if self.closed:
+            return
+        try:
+            self.print_summary()
+        finally:
+            self.close()
+
+    def print_summary(self):
         execution_summary = self.print_execution_summary()
 
         total_test_cases = len(test_cases())
-        total_test_passed = len(self.test_passed)
-        total_test_failed = len(self.test_failed)
-        total_test_not_executed = total_test_cases - (total_test_passed + total_test_failed)
+        total_test_passed = len([result for result in self.results if result.passed])
+        total_test_failed = len([result for result in self.results if result.status == FAILED])
+        total_test_errors = len([result for result in self.results if result.status == ERROR])
+        total_test_not_executed = total_test_cases - len(self.results)
 
         end_time = datetime.utcnow()
         self.logger.info('\n'.join([execution_summary, '', '',
@@ -75,20 +169,48 @@ class TestSuite:
                                     'EXECUTION TIMESTAMP: {}'.format(str(end_time)),
                                     print_separator('-'),
                                     'TOTAL TEST CASES: {}'.format(total_test_cases),
-                                    'TOTAL TEST CASES EXECUTED: {}'.format(len(self.execution_time)),
+                                    'TOTAL TEST CASES EXECUTED: {}'.format(len(self.results)),
                                     'TOTAL TEST CASES PASSED: {}'.format(total_test_passed),
                                     'TOTAL TEST CASES FAILED: {}'.format(total_test_failed),
-                                    'TOTAL TEST CASES NOT EXECUTED: {}'.format(total_test_not_executed)]))
-        self.web_driver.quit()
+                                    'TOTAL TEST CASES ERRORED: {}'.format(total_test_errors),
+                                    'TOTAL TEST CASES NOT EXECUTED: {}'.format(total_test_not_executed),
+                                    '', '', self.print_step_breakdown()]))
+
+        self.result_stream.close()
+        if self.config.get('smoke_test_history'):
+            history = HistoryStore(self.config['smoke_test_history'])
+            history.append(self.run_context(), self.results)
+            history.close()
+        trace_file = os.path.join(self.config['smoke_test_result'], 'trace.json')
+        tracer.export_chrome_trace(trace_file)
+        self.logger.info('Timing trace written to %s', trace_file)
+
+    def close(self):
+        """Close the result stream and quit the drivers, also when the execution raised."""
+        self.closed = True
+        self.result_stream.close()
+        if self.driver_pool is not None:
+            self.driver_pool.quit()
+        elif self.web_driver is not None:
+            self.web_driver.quit()
 
     def print_execution_summary(self):
         exec_summary_head = ' '.join([print_separator('#'), 'EXECUTION SUMMARY', print_separator('#')])
         header = '\t\t'.join(['TEST CASE NAME', 'STATUS', 'EXECUTION TIME', 'RESPONSE TIME', 'END POINT'])
 
         summary = []
-        for test_case, result, exec_time, resp_time in zip(test_cases(), self.test_results, self.execution_time,
-                                                           self.response_time):
-            summary.append(' '.join([test_case, result, exec_time, resp_time, self.iamss_url]))
+        for result in self.results:
+            summary.append(' '.join([result.name, result.status, result.end_timestamp(),
+                                     '{:.0f} ms'.format(result.duration_ms), result.end_point]))
             summary.append('\n')
 
         return '\n'.join(['', exec_summary_head, header, print_separator('='), ''.join(summary), print_separator('=')])
+
+    def print_step_breakdown(self):
+        breakdown = [' '.join([print_separator('#'), 'STEP BREAKDOWN', print_separator('#')])]
+        for result in self.results:
+            breakdown.append('{} {:.1f} ms'.format(result.name, result.duration_ms))
+            for step, duration_ms, count in result.steps:
+                breakdown.append('\t{} {:.1f} ms ({}x)'.format(step, duration_ms, count))
+        breakdown.append(print_separator('='))
+        return '\n'.join(breakdown)
@@ -0,0 +1,103 @@
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Span:
+    """Timed, named block of a test run. Times are monotonic nanoseconds (time.perf_counter_ns)."""
+    __slots__ = ('name', 'args', 'tid', 'start_ns', 'end_ns', 'children')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.tid = threading.get_ident()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.children = []
+
+    @property
+    def duration_ns(self):
+        return (self.end_ns or time.perf_counter_ns()) - self.start_ns
+
+    @property
+    def duration_ms(self):
+        return self.duration_ns / 1e6
+
+    def breakdown(self):
+        """Total duration in ms and count of the direct children, per child name, in order of first start.
+        :return: list of (name, duration_ms, count)
+        """
+        steps = {}
+        for child in self.children:
+            duration_ms, count = steps.get(child.name, (0.0, 0))
+            steps[child.name] = (duration_ms + child.duration_ms, count + 1)
+        return [(name, duration_ms, count) for name, (duration_ms, count) in steps.items()]
+
+
+class Tracer:
+    """Collect nested spans per thread.
+    Usage:
+    with tracer.span('login', user='a'):
+        with tracer.span('submit'):
+            ...
+    tracer.export_chrome_trace('trace.json')
+    """
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.origin_ns = time.perf_counter_ns()
+
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def span(self, name, **args):
+        stack = self.stack()
+        span = Span(name, args)
+        if stack:
+            stack[-1].children.append(span)
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            span.end_ns = time.perf_counter_ns()
+            stack.pop()
+            with self.lock:
+                self.spans.append(span)
+
+    def export_chrome_trace(self, path):
+        """Write the finished spans as Chrome trace-event JSON, viewable in chrome://tracing or Perfetto.
+        The written spans are dropped, a process running several suites exports the spans of each suite once.
+        """
+        pid = os.getpid()
+        with self.lock:
+            spans, self.spans = self.spans, []
+            events = [{'name': span.name,
+                       'ph': 'X',
+                       'ts': (span.start_ns - self.origin_ns) / 1e3,
+                       'dur': span.duration_ns / 1e3,
+                       'pid': pid,
+                       'tid': span.tid,
+                       'args': span.args} for span in spans]
+        with open(path, 'w') as _f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, _f)
+
+
+tracer = Tracer()
+
+
+def traced(func):
+    """Record a span named after the method for each call, with the first argument when it is a string."""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        span_args = {'target': args[0]} if args and isinstance(args[0], str) else {}
+        with tracer.span(func.__name__, **span_args):
+            return func(self, *args, **kwargs)
+    return wrapper
@@ -11,12 +11,15 @@ TEST_ORG_ADMIN_USER = '04. SS_ORG_ADMIN_USER'
 
 def setup_logger(log_object, level):
     """
-    Setup logger with a level for the logger.
+    Setup logger with a level for the logger, the handler is added once per logger.
     :param log_object:
     :param level:
     :return:
     """
     log_object.setLevel(level)
+    if log_object.handlers:
+        log_object.handlers[0].setLevel(level)
+        return
     ch = logging.StreamHandler()
     ch.setLevel(level)
     formatter = logging.Formatter(
@@ -44,12 +47,27 @@ def parse_args():
     parser.add_argument('-c',
                         '--config',
                         dest='config',
-                        required=True,
-                        action='store',
+                        action='append',
                         help='Path to file containing configurations for '
-                             'deployment in YML format.\n'
+                             'deployment in YML format. Repeat to smoke test several targets.\n'
                              'For Example: configurations/custom/deployment_config.yml')
+    parser.add_argument('-m',
+                        '--matrix',
+                        dest='matrix',
+                        action='store',
+                        help='Path to file containing a target matrix in YML format: '
+                             '"config" the base deployment configuration and '
+                             '"targets" a list of overrides of it, one per target.')
+    parser.add_argument('-w',
+                        '--workers',
+                        dest='workers',
+                        type=int,
+                        default=4,
+                        action='store',
+                        help='Number of targets smoke tested at the same time.')
     options = parser.parse_args()
+    if not options.config and not options.matrix:
+        parser.error('one of the arguments -c/--config -m/--matrix is required')
 
     return options
 
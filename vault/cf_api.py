@@ -0,0 +1,159 @@
+"""
+Cloud Foundry v3 API client for the vault service key, replacing the calls of the cf CLI.
+Usage:
+
+cf = CfClient('https://api.sys.example.com', 'https://login.sys.example.com')
+cf.login(cf_user, cf_pass)
+space_guid = cf.space_guid(org, space)
+instance_guid = cf.ensure_service_instance(space_guid, 'hsdp-vault', 'vault-us-east-1', 'my-vault')
+credentials = cf.ensure_service_key(instance_guid, 'my-vault-service-key')
+"""
+
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+from auth_client.session import HttpSession
+
+LOGGER = logging.getLogger('deploy')
+
+JOB_POLL_INTERVAL = 1.0
+JOB_TIMEOUT = 300
+
+
+class CfApiError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class CfClient:
+    def __init__(self, api_url, login_url, session=None):
+        """
+        :param api_url: Cloud Controller URL, e.g. https://api.<cf host>
+        :param login_url: UAA URL, e.g. https://login.<cf host>
+        :param session: HttpSession, one keep-alive session is used for all the requests.
+            The POST creating resources must not be retried, see create.
+        """
+        self.api_url = api_url.rstrip('/')
+        self.login_url = login_url.rstrip('/')
+        self.session = session or HttpSession()
+        self.token = None
+        self.expires_at = 0
+        self.credentials = None
+        self.lock = threading.Lock()
+
+    def login(self, username, password):
+        """Password grant of the cf CLI client on UAA."""
+        self.credentials = (username, password)
+        response = self.session.post('{}/oauth/token'.format(self.login_url),
+                                     data={'grant_type': 'password', 'username': username, 'password': password},
+                                     auth=('cf', ''), headers={'Accept': 'application/json'})
+        if response.status_code != 200:
+            raise CfApiError('CF login of {} failed: {}'.format(username, response.text), response.status_code)
+        token = response.json()
+        with self.lock:
+            self.token = token['access_token']
+            self.expires_at = time.time() + int(token.get('expires_in', 0))
+        return self
+
+    def request(self, method, path, **kwargs):
+        """Cloud Controller request, the login is renewed when the token expired.
+        :return: response
+        :raises CfApiError: If the request failed
+        """
+        if self.expires_at - 30 < time.time() and self.credentials:
+            self.login(*self.credentials)
+        response = self.session.request(method, '{}{}'.format(self.api_url, path),
+                                        headers={'Authorization': 'bearer {}'.format(self.token),
+                                                 'Accept': 'application/json'}, **kwargs)
+        if response.status_code >= 400:
+            raise CfApiError('{} {} failed: {}'.format(method, path, response.text), response.status_code)
+        return response
+
+    def find(self, path, **params):
+        """First resource of a list endpoint matching the filters, None if there is none."""
+        resources = self.request('GET', path, params=params).json()['resources']
+        return resources[0] if resources else None
+
+    def guid(self, kind, path, **params):
+        resource = self.find(path, **params)
+        if resource is None:
+            raise CfApiError('{} {} not found'.format(kind, ', '.join(str(value) for value in params.values())), 404)
+        return resource['guid']
+
+    def space_guid(self, org, space):
+        org_guid = self.guid('Organization', '/v3/organizations', names=org)
+        return self.guid('Space', '/v3/spaces', names=space, organization_guids=org_guid)
+
+    def ensure_service_instance(self, space_guid, offering, plan, name):
+        """Guid of the managed service instance, created if missing (cf create-service)."""
+        instance = self.find('/v3/service_instances', names=name, space_guids=space_guid)
+        if instance is not None:
+            return instance['guid']
+
+        plan_guid = self.guid('Service plan', '/v3/service_plans', names=plan, service_offering_names=offering,
+                              space_guids=space_guid)
+        LOGGER.info('Creating service instance %s...', name)
+        self.create('/v3/service_instances', {
+            'type': 'managed',
+            'name': name,
+            'relationships': {'space': {'data': {'guid': space_guid}},
+                              'service_plan': {'data': {'guid': plan_guid}}}})
+        return self.guid('Service instance', '/v3/service_instances', names=name, space_guids=space_guid)
+
+    def ensure_service_key(self, instance_guid, name):
+        """Credentials of the service key, created if missing (cf create-service-key, cf service-key)."""
+        key = self.find('/v3/service_credential_bindings', type='key', names=name,
+                        service_instance_guids=instance_guid)
+        if key is None:
+            LOGGER.info('Creating service key %s...', name)
+            self.create('/v3/service_credential_bindings', {
+                'type': 'key',
+                'name': name,
+                'relationships': {'service_instance': {'data': {'guid': instance_guid}}}})
+            key = {'guid': self.guid('Service key', '/v3/service_credential_bindings', type='key', names=name,
+                                     service_instance_guids=instance_guid)}
+
+        details = self.request('GET', '/v3/service_credential_bindings/{}/details'.format(key['guid'])).json()
+        return details['credentials']
+
+    def create(self, path, resource):
+        """Create the resource and wait for its job. A 422 means the name is taken, e.g. by a concurrent
+        deployment or an earlier attempt whose response was lost, and the caller looks the resource up again.
+        """
+        try:
+            response = self.request('POST', path, json=resource)
+        except CfApiError as error:
+            if error.status != 422:
+                raise
+            LOGGER.info('%s already exists: %s', resource['name'], error)
+            return
+        self.wait_for_job(response)
+
+    def wait_for_job(self, response):
+        """Wait for the asynchronous job of a 202 response."""
+        if response.status_code != 202:
+            return
+        job_path = urlsplit(response.headers['Location']).path
+        deadline = time.time() + JOB_TIMEOUT
+        while True:
+            job = self.request('GET', job_path).json()
+            if job['state'] == 'COMPLETE':
+                return
+            if job['state'] == 'FAILED':
+                raise CfApiError('Job {} failed: {}'.format(job_path, job.get('errors')))
+            if time.time() > deadline:
+                raise CfApiError('Job {} not completed after {} secs'.format(job_path, JOB_TIMEOUT))
+            time.sleep(JOB_POLL_INTERVAL)
+
+
+cf_clients = {}
+
+
+def shared_cf_client(api_url, login_url):
+    """CF client shared by the calls of the process, one per API URL."""
+    if api_url not in cf_clients:
+        cf_clients[api_url] = CfClient(api_url, login_url)
+    return cf_clients[api_url]
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+"""
+Local stand-in for the UAA and Cloud Controller v3 endpoints called by vault.cf_api.CfClient,
+to test the vault credential chain without a Cloud Foundry.
+Usage:
+python -m vault.cf_stand_in --port 8081 --org my-org --space my-space
+
+    POST /oauth/token                                   password grant
+    GET  /v3/organizations?names=                       organization by name
+    GET  /v3/spaces?names=&organization_guids=          space by name
+    GET  /v3/service_plans?names=&service_offering_names=
+    GET  /v3/service_instances?names=&space_guids=
+    POST /v3/service_instances                          202, completed job, 422 when the name is taken
+    GET  /v3/service_credential_bindings?type=key&names=&service_instance_guids=
+    POST /v3/service_credential_bindings                202, completed job, 422 when the name is taken
+    GET  /v3/service_credential_bindings/<guid>/details vault credentials of the key
+    GET  /v3/jobs/<guid>
+
+Every service plan exists, service keys hold vault approle credentials.
+"""
+
+import argparse
+import json
+import uuid
+from urllib.parse import urlsplit, parse_qs
+
+from auth_client.stand_in import JsonHandler, StandInServer
+
+
+class CfStandInHandler(JsonHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        path = urlsplit(self.path).path
+        if path == '/oauth/token':
+            if parse_qs(body).get('password', [''])[0] != self.server.password:
+                return self.reply(401, {'error': 'unauthorized', 'error_description': 'Bad credentials'})
+            return self.reply(200, {'access_token': uuid.uuid4().hex, 'token_type': 'bearer', 'expires_in': 599})
+        if not self.authorized():
+            return
+        resource = json.loads(body)
+        resource['guid'] = uuid.uuid4().hex
+        with self.server.lock:
+            if path == '/v3/service_instances':
+                resources, request = self.server.instances, 'create-service'
+            elif path == '/v3/service_credential_bindings':
+                resources, request = self.server.keys, 'create-service-key'
+            else:
+                return self.reply(404, {'errors': [{'detail': 'Unknown request'}]})
+            if any(existing['name'] == resource['name'] and
+                   existing['relationships'] == resource['relationships'] for existing in resources):
+                return self.reply(422, {'errors': [{'detail': 'The name {} is taken'.format(resource['name'])}]})
+            self.server.requests[request] += 1
+            resources.append(resource)
+        job = '{}/v3/jobs/{}'.format(self.server.url, uuid.uuid4().hex)
+        self.reply(202, None, {'Location': job})
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        url = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        server = self.server
+        with server.lock:
+            if url.path == '/v3/organizations':
+                found = [org for org in [server.org] if org['name'] == query.get('names')]
+            elif url.path == '/v3/spaces':
+                found = [space for space in [server.space] if space['name'] == query.get('names') and
+                         space['organization_guid'] == query.get('organization_guids')]
+            elif url.path == '/v3/service_plans':
+                found = [{'guid': '{}-{}'.format(query.get('service_offering_names'), query.get('names'))}]
+            elif url.path == '/v3/service_instances':
+                found = [instance for instance in server.instances if instance['name'] == query.get('names') and
+                         instance['relationships']['space']['data']['guid'] == query.get('space_guids')]
+            elif url.path == '/v3/service_credential_bindings':
+                found = [key for key in server.keys if key['name'] == query.get('names') and
+                         key['relationships']['service_instance']['data']['guid'] ==
+                         query.get('service_instance_guids')]
+            elif url.path.startswith('/v3/jobs/'):
+                return self.reply(200, {'guid': url.path.split('/')[-1], 'state': 'COMPLETE'})
+            elif url.path.startswith('/v3/service_credential_bindings/') and url.path.endswith('/details'):
+                guid = url.path.split('/')[-2]
+                if not any(key['guid'] == guid for key in server.keys):
+                    return self.reply(404, {'errors': [{'detail': 'Service credential binding not found'}]})
+                return self.reply(200, {'credentials': server.credentials(guid)})
+            else:
+                return self.reply(404, {'errors': [{'detail': 'Unknown request'}]})
+        self.reply(200, {'pagination': {'total_results': len(found)}, 'resources': found})
+
+    def authorized(self):
+        if not self.headers.get('Authorization', '').startswith('bearer '):
+            self.reply(401, {'errors': [{'detail': 'Authentication error'}]})
+            return False
+        return True
+
+
+class CfStandIn(StandInServer):
+    """
+    Stand-in UAA and Cloud Controller running on a background thread, serving both on one port.
+    Usage:
+
+    with CfStandIn('my-org', 'my-space') as stand_in:
+        CfClient(stand_in.url, stand_in.url).login('user', stand_in.password)
+    """
+    thread_name = 'cf-stand-in'
+
+    def __init__(self, org='org', space='space', port=0, password='password', vault_endpoint='http://127.0.0.1:8200'):
+        """
+        :param org: Name of the organization
+        :param space: Name of the space of the organization
+        :param port: Port to listen on, 0 picks a free port
+        :param password: Password accepted by the password grant
+        :param vault_endpoint: Vault endpoint of the service key credentials
+        """
+        super().__init__(CfStandInHandler, port)
+        self.server.password = password
+        self.server.org = {'guid': uuid.uuid4().hex, 'name': org}
+        self.server.space = {'guid': uuid.uuid4().hex, 'name': space, 'organization_guid': self.server.org['guid']}
+        self.server.instances = []
+        self.server.keys = []
+        self.server.requests = {'create-service': 0, 'create-service-key': 0}
+        self.server.credentials = lambda guid: {
+            'endpoint': vault_endpoint,
+            'role_id': 'role-{}'.format(guid),
+            'secret_id': 'secret-{}'.format(guid),
+            'org_secret_path': '/v1/cf/{}/secret'.format(self.server.org['guid']),
+            'space_secret_path': '/v1/cf/{}/secret'.format(self.server.space['guid']),
+            'service_secret_path': '/v1/cf/{}/secret'.format(guid)
+        }
+        self.server.url = self.url
+        self.password = password
+
+    @property
+    def requests(self):
+        """Number of service instances and service keys created."""
+        return self.server.requests
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', dest='port', type=int, default=8081, action='store')
+    parser.add_argument('--org', dest='org', default='org', action='store')
+    parser.add_argument('--space', dest='space', default='space', action='store')
+    parser.add_argument('--password', dest='password', default='password', action='store',
+                        help='Password accepted by the password grant.')
+    args = parser.parse_args()
+
+    stand_in = CfStandIn(args.org, args.space, args.port, args.password)
+    print('Stand-in UAA/Cloud Controller listening on {}'.format(stand_in.url))
+    try:
+        stand_in.server.serve_forever()
+    except KeyboardInterrupt:
+        stand_in.server.server_close()
@@ -0,0 +1,74 @@
+import threading
+import time
+
+from auth_client.encrypted_file import EncryptedJsonFile, shared_by_path
+
+
+class CredentialCache:
+    """
+    Caches the vault service key credentials keyed by (cf_host, org, space, service)
+    so get_hvac_client skips the Cloud Foundry API lookups of get_vault_credentials.
+    Usage:
+
+    cache = CredentialCache(ttl=3600)
+    key = cache.key(cf_host, org, space, service)
+    credentials = cache.get(key) or cache.put(key, get_vault_credentials(...))
+
+    Credentials are reused for ttl secs. The caller validates them on use and invalidates them
+    when vault rejects the role_id/secret_id, e.g. after the service key was recreated.
+    With path and secret the cache is persisted to a file encrypted with Fernet, which requires
+    the cryptography package.
+    """
+
+    def __init__(self, ttl=3600, path=None, secret=None):
+        self.ttl = ttl
+        self.store = EncryptedJsonFile(path, secret, 'vault credentials') if path else None
+        self.credentials = {}
+        self.lock = threading.Lock()
+
+        if self.store:
+            self.load()
+
+    @staticmethod
+    def key(cf_host, org, space, service):
+        return '|'.join([cf_host, org, space, service])
+
+    def get(self, key):
+        """Credentials cached less than ttl secs ago, else None."""
+        with self.lock:
+            cached = self.credentials.get(key)
+        if cached is not None and cached['cached_at'] + self.ttl > time.time():
+            return cached['credentials']
+        return None
+
+    def put(self, key, credentials):
+        with self.lock:
+            self.credentials[key] = {'credentials': credentials, 'cached_at': time.time()}
+        self.save()
+        return credentials
+
+    def invalidate(self, key):
+        with self.lock:
+            self.credentials.pop(key, None)
+        self.save()
+
+    def load(self):
+        credentials = self.store.load() or {}
+        now = time.time()
+        self.credentials = {key: cached for key, cached in credentials.items()
+                            if cached['cached_at'] + self.ttl > now}
+
+    def save(self):
+        if not self.store:
+            return
+        with self.lock:
+            credentials = dict(self.credentials)
+        self.store.save(credentials)
+
+
+credential_caches = {}
+
+
+def shared_credential_cache(ttl=3600, path=None, secret=None):
+    """Credential cache shared by the vault clients of the process, one per persistence file."""
+    return shared_by_path(credential_caches, path, lambda: CredentialCache(ttl, path, secret))
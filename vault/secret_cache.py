@@ -0,0 +1,114 @@
+import copy
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LOGGER = logging.getLogger('deploy')
+
+
+class SecretCache:
+    """
+    Caches vault secrets in process keyed by vault path, so repeated reads cost no network I/O.
+    Usage:
+
+    cache = SecretCache(max_ttl=300)
+    config = cache.get(path, lambda: read_with_lease(path), parse=yaml.safe_load)
+
+    A secret is kept for its lease_duration, at most max_ttl secs. Once refresh_ahead of that time
+    has passed, the cached secret is still returned and reloaded in background with the loader of the
+    latest get, so a long running process does not wait for vault when the secret expires.
+    With parse the parsed value is cached as well and a copy of it is returned.
+    """
+
+    def __init__(self, max_ttl=300, refresh_ahead=0.75, workers=2):
+        """
+        :param max_ttl: Upper bound in secs a secret is cached, 0 disables the cache
+        :param refresh_ahead: Fraction of the ttl after which the secret is reloaded in background
+        :param workers: Number of background reloads in flight
+        """
+        self.max_ttl = max_ttl
+        self.refresh_ahead = refresh_ahead
+        self.secrets = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='secret-refresh')
+
+    def get(self, path, loader, parse=None):
+        """Cached secret of the path, loaded when missing or expired.
+        :param loader: Callable returning (secret, lease_duration in secs)
+        :param parse: Optional callable parsing the secret, e.g. yaml.safe_load
+        :return: Secret, or a copy of the parsed secret with parse
+        """
+        if not self.max_ttl:
+            secret, lease_duration = loader()
+            return parse(secret) if parse and secret is not None else secret
+
+        now = time.time()
+        with self.lock:
+            cached = self.secrets.get(path)
+            if cached is not None:
+                cached['loader'] = loader
+            if cached is not None and cached['refresh_at'] <= now < cached['expires_at'] \
+                    and path not in self.refreshing:
+                self.refreshing.add(path)
+                self.executor.submit(self.refresh, path)
+
+        if cached is None or cached['expires_at'] <= now:
+            cached = self.load(path, loader)
+        return self.value(cached, parse)
+
+    def load(self, path, loader):
+        secret, lease_duration = loader()
+        ttl = min(lease_duration or self.max_ttl, self.max_ttl)
+        now = time.time()
+        cached = {'secret': secret, 'parsed': {}, 'loader': loader,
+                  'refresh_at': now + ttl * self.refresh_ahead, 'expires_at': now + ttl}
+        with self.lock:
+            self.secrets[path] = cached
+        return cached
+
+    def refresh(self, path):
+        try:
+            with self.lock:
+                cached = self.secrets.get(path)
+            if cached is not None:
+                self.load(path, cached['loader'])
+            LOGGER.debug('Vault secret %s refreshed.', path)
+        except Exception as error:
+            LOGGER.warning('Refresh of vault secret %s failed, keeping it until it expires: %s', path, error)
+        finally:
+            with self.lock:
+                self.refreshing.discard(path)
+
+    def value(self, cached, parse):
+        if parse is None or cached['secret'] is None:
+            return cached['secret']
+        with self.lock:
+            parsed = cached['parsed'].get(parse)
+        if parsed is None:
+            parsed = parse(cached['secret'])
+            with self.lock:
+                cached['parsed'][parse] = parsed
+        return copy.deepcopy(parsed)
+
+    def invalidate(self, path):
+        with self.lock:
+            self.secrets.pop(path, None)
+
+
+DEFAULT_MAX_TTL = 300
+
+default_secret_cache = None
+
+
+def shared_secret_cache(max_ttl=None):
+    """Secret cache shared by the vault reads of the process, created on first use.
+    :param max_ttl: Upper bound in secs a secret is cached, 0 disables the cache, None keeps the current bound
+    """
+    global default_secret_cache
+    if default_secret_cache is None:
+        default_secret_cache = SecretCache(DEFAULT_MAX_TTL if max_ttl is None else max_ttl)
+    elif max_ttl is not None:
+        default_secret_cache.max_ttl = max_ttl
+    return default_secret_cache
@@ -3,17 +3,34 @@
 Helper to create/read vault information.
 """
 import base64
+import gzip
 import json
 import logging
-import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import hvac
-from jinja2 import Environment, FileSystemLoader
+from hvac.exceptions import Forbidden, InvalidRequest, VaultError
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 import os
-from subprocess import Popen, PIPE
+
+from auth_client.encrypted_file import EncryptedJsonFile
+from auth_client.session import HttpSession
+from vault.cf_api import CfApiError, shared_cf_client
+from vault.credential_cache import shared_credential_cache
+from vault.secret_cache import shared_secret_cache
 
 LOGGER = logging.getLogger('deploy')
 
+IAM_CREDENTIAL_KEYS = ('openam_host', 'openam_username', 'openam_userpass', 'oauth_clientid', 'oauth_clientpass',
+                       'openidm_host', 'openidm_username', 'openidm_userpass', 'api_secret_key', 'api_shared_key',
+                       'encryption_key', 'notification_host')
+SERVICE_ACCOUNT_KEYS = ('am_service_account_id', 'am_service_account_secret', 'am_publisher_id')
+B64_BUFFER_SIZE = 3 * 16 * 1024
+
+template_environments = {}
+
 
 def write_app_config(cf_user, cf_pass, deploy_config, config_data):
     """Writes data required for setting up vault service for app deployment.
@@ -23,12 +40,11 @@ def write_app_config(cf_user, cf_pass, deploy_config, config_data):
                           format example: configurations/custom/deployment_config.yml
     :param config_data: YML data containing secrets.
                         Format example: configurations/custom/vault_input_to_config.yml
+    :return: {'written': [paths], 'unchanged': [paths]}
     """
-    client, vault_info = get_hvac_client(cf_user, cf_pass, deploy_config)
-    space_secret_path = vault_info["space_secret_path"]
-    write_iam_app_config(client, space_secret_path,
-                         deploy_config['vault']['group'], config_data)
-    client.close()
+    with VaultSession(cf_user, cf_pass, deploy_config) as vault:
+        return vault.write_iam_app_config(vault.vault_info["space_secret_path"],
+                                          deploy_config['vault']['group'], config_data)
 
 
 def write_deployment_input(cf_user, cf_pass, deploy_config, file_path):
@@ -40,10 +56,9 @@ def write_deployment_input(cf_user, cf_pass, deploy_config, file_path):
                           data is written under 'vault:deploy_config'
     :param file_path: Path to secrets file. Example: configurations/vault_input_to_config_manifest_template.yml.j2
     """
-    client, vault_info = get_hvac_client(cf_user, cf_pass, deploy_config)
-    # Include vault_group for the path.
-    write_file_to_vault(client, vault_info["service_secret_path"], deploy_config, file_path)
-    client.adapter.close()
+    with VaultSession(cf_user, cf_pass, deploy_config) as vault:
+        # Include vault_group for the path.
+        vault.write_file_to_vault(vault.vault_info["service_secret_path"], file_path)
 
 
 def read_deployment_input(cf_user, cf_pass, deploy_config):
@@ -55,49 +70,90 @@ def read_deployment_input(cf_user, cf_pass, deploy_config):
                           data stored under 'vault:deploy_config' is read.
     :return: secret data in string format
     """
-    client, vault_info = get_hvac_client(cf_user, cf_pass, deploy_config)
-    data = read_file_from_vault(client, vault_info["service_secret_path"],
-                                deploy_config['vault']['config_data_path'])
-    client.close()
+    with VaultSession(cf_user, cf_pass, deploy_config) as vault:
+        data = vault.read_file_from_vault(vault.vault_info["service_secret_path"],
+                                          deploy_config['vault']['config_data_path'])
     if data:
         return base64.b64decode(data['data']['file'])
 
 
 def get_hvac_client(cf_user, cf_passwd, deploy_config):
     """ Get hvac client and path details such as space_secret_path
+    The vault credentials are cached, the service key is queried on CF again only when vault rejects the cached ones.
 
     :param cf_user:
     :param cf_passwd:
-    :param deploy_config:
+    :param deploy_config: vault_credential_cache_ttl and vault_credential_cache_file configure the cache
     :return: hvac based client, vault credentials/path
     """
-    cf_host = deploy_config['host']
-    credentials = get_vault_credentials(cf_host, cf_user, cf_passwd, deploy_config)
-    role_id = credentials["role_id"]
-    secret_id = credentials["secret_id"]
-    vproxy_endpoint = credentials["endpoint"]
-    client = hvac.Client(vproxy_endpoint)
-    token_output = client.auth_approle(role_id=role_id, secret_id=secret_id)
-    client.token = token_output['auth']['client_token']
-
+    client, credentials, auth = vault_login(cf_user, cf_passwd, deploy_config)
     return client, credentials
 
 
-def cf_cli_login(api, host, space, org, username, password):
-    """ Attempts CF login with given user name and password.
-        WARNING: DO NOT CALL THIS WITH INVALID CREDENTIALS
+def vault_login(cf_user, cf_passwd, deploy_config, session=None):
+    """ Log in to vault with the cached credentials, or the credentials of the service key when
+    vault rejects them.
+    :param session: requests session the hvac client sends its requests on
+    :return: hvac based client, vault credentials/path, auth of the login with the token lease
     """
-    command = ["cf", "login", "-a", api,
-               "-u", username,
-               "-p", password,
-               "-o", org,
-               "-s", space]
-    p = Popen(command, shell=False, stdout=PIPE).communicate()[0]
-    return username, password
+    cache, key = credential_cache(deploy_config)
+    credentials = cache.get(key)
+    if credentials is not None:
+        try:
+            client, auth = approle_client(credentials, session)
+            return client, credentials, auth
+        except (InvalidRequest, Forbidden) as error:
+            LOGGER.info('Cached vault credentials rejected, querying the service key again: %s', error)
+            cache.invalidate(key)
+
+    credentials = get_vault_credentials(deploy_config['host'], cf_user, cf_passwd, deploy_config)
+    client, auth = approle_client(credentials, session)
+    cache.put(key, credentials)
+
+    return client, credentials, auth
+
+
+def vault_credentials(cf_user, cf_passwd, deploy_config):
+    """ Cached vault credentials/path, the service key is queried on CF when none are cached.
+    vault_login validates them on use.
+    """
+    cache, key = credential_cache(deploy_config)
+    credentials = cache.get(key)
+    if credentials is None:
+        credentials = cache.put(key, get_vault_credentials(deploy_config['host'], cf_user, cf_passwd, deploy_config))
+    return credentials
+
+
+def credential_cache(deploy_config):
+    """ Credential cache configured by the deploy config and the key of its vault service """
+    cache = shared_credential_cache(deploy_config.get('vault_credential_cache_ttl', 3600),
+                                    deploy_config.get('vault_credential_cache_file'),
+                                    os.environ.get('VAULT_CREDENTIAL_CACHE_KEY'))
+    return cache, cache.key(deploy_config['host'], deploy_config['org_name'], deploy_config['space_name'],
+                            deploy_config['vault']['service'])
+
+
+def secret_cache(deploy_config):
+    """ Secret cache of the process, bounded by vault_secret_cache_ttl of the deploy config.
+    The bound applies to the reads through any VaultSession of the process, the last deploy config wins.
+    """
+    return shared_secret_cache(deploy_config.get('vault_secret_cache_ttl', 300))
+
+
+def approle_client(credentials, session=None):
+    """ Log in to vault with the role_id/secret_id of the credentials
+    :return: hvac based client, auth of the login
+    :raises InvalidRequest, Forbidden: If vault rejects the credentials
+    """
+    client = hvac.Client(credentials["endpoint"], session=session)
+    token_output = client.auth_approle(role_id=credentials["role_id"], secret_id=credentials["secret_id"])
+    client.token = token_output['auth']['client_token']
+    return client, token_output['auth']
 
 
 def get_vault_credentials(cf_host, cf_user, cf_passwd, deploy_config):
     """ Get vault credentials by querying service key on CF
+    The vault service instance and its service key are created if missing.
 
     :param cf_host: CF API host
     :param cf_user: CF user id
@@ -105,10 +161,11 @@ def get_vault_credentials(cf_host, cf_user, cf_passwd, deploy_config):
     :param deploy_config: YML data containing deployment destination config
                           format example: configurations/deployment_config.yml
                           data stored under 'vault:deploy_config' is read.
+                          cf_api_url and cf_login_url default to https://api.<host> and https://login.<host>
     :return: vault credentials
     """
-    api_host = 'api.{}'.format(cf_host)
-    login_host = 'login.{}'.format(cf_host)
+    api_url = deploy_config.get('cf_api_url', 'https://api.{}'.format(cf_host))
+    login_url = deploy_config.get('cf_login_url', 'https://login.{}'.format(cf_host))
     org = deploy_config['org_name']
     space = deploy_config['space_name']
 
@@ -116,29 +173,13 @@ def get_vault_credentials(cf_host, cf_user, cf_passwd, deploy_config):
     broker = deploy_config['vault']['broker_name']
     plan = deploy_config['vault']['plan']
 
-    cf_cli_login(api_host, login_host, space, org, cf_user, cf_passwd)
-    create_service = ["cf", "create-service", broker, plan, vault_service_name]
-    output = subprocess.Popen(create_service, shell=False,
-                              stdout=subprocess.PIPE).communicate()[0]
-    exit_if_error(output)
-
-    vault_service_key = '{}-service-key'.format(vault_service_name)
-    create_service_key = ["cf", "create-service-key", vault_service_name, vault_service_key]
-    output = subprocess.Popen(create_service_key, shell=False,
-                              stdout=subprocess.PIPE).communicate()[0]
-    exit_if_error(output)
-
-    service_key = ["cf", "service-key", vault_service_name, vault_service_key]
-    key_out = subprocess.Popen(service_key, shell=False, stdout=subprocess.PIPE).communicate()[0]
-
-    credentials = json.loads("{" + (key_out.decode("utf-8")).split("{")[-1])
-    return credentials
-
-
-def exit_if_error(output):
-    """Check if output contains string OK if not,exit"""
-    if b'OK' not in output:
-        LOGGER.error('Error:%s', output)
+    try:
+        cf = shared_cf_client(api_url, login_url).login(cf_user, cf_passwd)
+        space_guid = cf.space_guid(org, space)
+        instance_guid = cf.ensure_service_instance(space_guid, broker, plan, vault_service_name)
+        return cf.ensure_service_key(instance_guid, '{}-service-key'.format(vault_service_name))
+    except CfApiError as error:
+        LOGGER.error('Error:%s', error)
         sys.exit(1)
 
 
@@ -153,92 +194,78 @@ def read_file_from_vault(client, secret_path, group):
     return data
 
 
-def write_iam_app_config(client, vault_path, group, env_input_config_yml):
+def write_iam_app_config(client, vault_path, group, env_input_config_yml, workers=8):
     """ Write application configuration secrets to vault
+    The iam path and its subgroups are written concurrently, each path only when its data differs.
     :param client: hvac client
     :param vault_path: path to write to
     :param env_input_config_yml: YML data with secrets
-    :return:
+    :param workers: Number of paths read/written concurrently
+    :return: {'written': [paths], 'unchanged': [paths]}
     """
     vault_iam = '{0}/{1}'.format(vault_path.strip('/v1/'), 'iam')
-    write_iam_credentials(client, vault_iam, env_input_config_yml)
-
+    paths = [vault_iam]
     if group:
-        subgroups = group.split(" ")
-        for subgroup in subgroups:
-            subgroup_path = '{0}/{1}'.format(vault_iam, subgroup)
-            if subgroup == 'sign_certs':
-                client.write(subgroup_path,
-                             algorithm=env_input_config_yml['sign_certs']['algorithm'],
-                             expiry=env_input_config_yml['sign_certs']['expiry'],
-                             private_key=env_input_config_yml['sign_certs']['private_key'])
-            else:
-                write_iam_credentials(client, subgroup_path, env_input_config_yml)
+        paths.extend('{0}/{1}'.format(vault_iam, subgroup) for subgroup in group.split(" "))
+
+    def write(path):
+        if path.endswith('/sign_certs'):
+            sign_certs = env_input_config_yml['sign_certs']
+            desired = {'algorithm': sign_certs['algorithm'],
+                       'expiry': sign_certs['expiry'],
+                       'private_key': sign_certs['private_key']}
+            return write_if_changed(client, path, read_data(client, path), desired)
+        return write_iam_credentials(client, path, env_input_config_yml)
+
+    summary = {'written': [], 'unchanged': []}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for path, written in zip(paths, executor.map(write, paths)):
+            summary['written' if written else 'unchanged'].append(path)
+
+    LOGGER.info('Vault iam config: %d paths written, %d unchanged.',
+                len(summary['written']), len(summary['unchanged']))
+    return summary
 
 
 def write_iam_credentials(client, path, env_input_config_yml):
-    """ Write credentials data to given vault path """
+    """ Write credentials data to given vault path, unless it already holds the same data
+    :return: True if the path was written
+    """
+    existing = read_data(client, path)
+
+    written = write_if_changed(client, path, existing, iam_credentials(env_input_config_yml, existing))
+    if written:
+        LOGGER.info('Vault path[%s] updated with credentials.', path)
+    return written
+
+
+def iam_credentials(env_input_config_yml, existing=None):
+    """ Credentials data of an iam path, the notification service account already in vault is kept. """
+    credentials = {key: env_input_config_yml[key] for key in IAM_CREDENTIAL_KEYS}
+    service_account = existing if existing and existing.get('am_service_account_id') is not None \
+        else env_input_config_yml
+    for key in SERVICE_ACCOUNT_KEYS:
+        credentials[key] = service_account.get(key)
+    return credentials
+
+
+def read_data(client, path):
+    """ Data of a vault path, None if the path is not written """
     data = client.read(path)
+    return data.get('data') if data is not None else None
 
-    if data is None:
-        client.write(path,
-                     openam_host=env_input_config_yml['openam_host'],
-                     openam_username=env_input_config_yml['openam_username'],
-                     openam_userpass=env_input_config_yml['openam_userpass'],
-                     oauth_clientid=env_input_config_yml['oauth_clientid'],
-                     oauth_clientpass=env_input_config_yml['oauth_clientpass'],
-                     openidm_host=env_input_config_yml['openidm_host'],
-                     openidm_username=env_input_config_yml['openidm_username'],
-                     openidm_userpass=env_input_config_yml['openidm_userpass'],
-                     api_secret_key=env_input_config_yml['api_secret_key'],
-                     api_shared_key=env_input_config_yml['api_shared_key'],
-                     encryption_key=env_input_config_yml['encryption_key'],
-                     notification_host=env_input_config_yml['notification_host'],
-                     am_service_account_id=env_input_config_yml.get('am_service_account_id'),
-                     am_service_account_secret=env_input_config_yml.get('am_service_account_secret'),
-                     am_publisher_id=env_input_config_yml.get('am_publisher_id'))
-    else:
-        response_data = data.get('data')
-        notification_service_id = response_data.get('am_service_account_id')
-
-        if notification_service_id is None:
-
-            client.write(path,
-                         openam_host=env_input_config_yml['openam_host'],
-                         openam_username=env_input_config_yml['openam_username'],
-                         openam_userpass=env_input_config_yml['openam_userpass'],
-                         oauth_clientid=env_input_config_yml['oauth_clientid'],
-                         oauth_clientpass=env_input_config_yml['oauth_clientpass'],
-                         openidm_host=env_input_config_yml['openidm_host'],
-                         openidm_username=env_input_config_yml['openidm_username'],
-                         openidm_userpass=env_input_config_yml['openidm_userpass'],
-                         api_secret_key=env_input_config_yml['api_secret_key'],
-                         api_shared_key=env_input_config_yml['api_shared_key'],
-                         encryption_key=env_input_config_yml['encryption_key'],
-                         notification_host=env_input_config_yml['notification_host'],
-                         am_service_account_id=env_input_config_yml.get('am_service_account_id'),
-                         am_service_account_secret=env_input_config_yml.get('am_service_account_secret'),
-                         am_publisher_id=env_input_config_yml.get('am_publisher_id'))
-
-        else:
-            client.write(path,
-                         openam_host=env_input_config_yml['openam_host'],
-                         openam_username=env_input_config_yml['openam_username'],
-                         openam_userpass=env_input_config_yml['openam_userpass'],
-                         oauth_clientid=env_input_config_yml['oauth_clientid'],
-                         oauth_clientpass=env_input_config_yml['oauth_clientpass'],
-                         openidm_host=env_input_config_yml['openidm_host'],
-                         openidm_username=env_input_config_yml['openidm_username'],
-                         openidm_userpass=env_input_config_yml['openidm_userpass'],
-                         api_secret_key=env_input_config_yml['api_secret_key'],
-                         api_shared_key=env_input_config_yml['api_shared_key'],
-                         encryption_key=env_input_config_yml['encryption_key'],
-                         notification_host=env_input_config_yml['notification_host'],
-                         am_service_account_id=response_data.get('am_service_account_id'),
-                         am_service_account_secret=response_data.get('am_service_account_secret'),
-                         am_publisher_id=response_data.get('am_publisher_id'))
-
-    LOGGER.info('Vault path[%s] updated with credentials.', path)
+
+def write_if_changed(client, path, existing, desired):
+    """ Write desired to path when it differs from the existing data of the path
+    :return: True if the path was written
+    """
+    if existing == desired:
+        LOGGER.debug('Vault path[%s] is unchanged.', path)
+        return False
+    # Posted as a dict, the keys of a secret may clash with the keyword arguments of client.write, e.g. wrap_ttl.
+    client.adapter.post('/v1/{}'.format(path), json=desired)
+    shared_secret_cache().invalidate(path)
+    return True
 
 
 def write_file_to_vault(client, vault_path, deploy_config, file_path):
@@ -252,44 +279,92 @@ def write_file_to_vault(client, vault_path, deploy_config, file_path):
     :return:
     """
     head, jinja_template_file_name = os.path.split(file_path)
-    j2 = Environment(loader=FileSystemLoader(head), trim_blocks=True)
+    j2 = template_environment(head, deploy_config.get('jinja_bytecode_cache_dir'))
     template = j2.get_template(jinja_template_file_name)
-    beautifull_content = str(template.render(**deploy_config))
-    file_content = base64.b64encode(beautifull_content.encode('utf-8'))
+    # Encode while rendering instead of holding the rendered, utf-8 and b64 copies of the manifest.
+    file_content = ''.join(b64encode_chunks(template.generate(**deploy_config)))
 
-    vault_group_path = '/'.join([deploy_config['vault']['group'], deploy_config['vault']['config_data_path']])
-    path = '{0}/{1}'.format(vault_path.strip('/v1/'), vault_group_path)
+    path = app_config_path(vault_path, deploy_config)
+    client.write(path, file=file_content)
+    shared_secret_cache().invalidate(path)
 
-    client.write(path, file=file_content.decode('utf-8'))
+
+def template_environment(directory, bytecode_cache_dir=None):
+    """ Jinja environment of a template directory, shared by the calls of the process.
+    Templates are compiled once per process and reloaded when their file changes, the compiled
+    bytecode is cached on disk by template name and source checksum across processes.
+    :param directory: Template directory
+    :param bytecode_cache_dir: Directory of the bytecode cache, defaults to a directory in the temp dir
+    :return: jinja2 Environment
+    """
+    j2 = template_environments.get(directory)
+    if j2 is None:
+        j2 = template_environments.setdefault(directory, Environment(
+            loader=FileSystemLoader(directory), trim_blocks=True, auto_reload=True,
+            bytecode_cache=FileSystemBytecodeCache(bytecode_cache_dir)))
+    return j2
+
+
+def b64encode_chunks(chunks, buffer_size=B64_BUFFER_SIZE):
+    """ Base64 encode text chunks as they come, e.g. from template.generate()
+    :param chunks: Iterable of str
+    :param buffer_size: Bytes encoded at once, a multiple of 3 so the encoded chunks concatenate
+    :return: Iterator of base64 str
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk.encode('utf-8')
+        if len(buffer) >= buffer_size:
+            size = len(buffer) - len(buffer) % 3
+            yield base64.b64encode(buffer[:size]).decode('ascii')
+            del buffer[:size]
+    if buffer:
+        yield base64.b64encode(buffer).decode('ascii')
 
 
 def is_post_deployment_required(cf_user, cf_pass, deploy_config, config_data):
     return read_app_config(cf_user, cf_pass, deploy_config)
 
 
-def read_app_config(cf_user, cf_pass, deploy_config, secret_path='service_secret_path'):
-    client, vault_info = get_hvac_client(cf_user, cf_pass, deploy_config)
-    service_secret_path = vault_info[secret_path]
-    vault = deploy_config.get('vault')
-    group = vault.get('group')
-    config_data_path = vault.get('config_data_path')
+def read_app_config(cf_user, cf_pass, deploy_config, secret_path='service_secret_path', parse=None):
+    """ Read the config file written by write_deployment_input, cached in process for the lease of the
+    secret, at most vault_secret_cache_ttl secs.
+    :param parse: Optional callable parsing the decoded config, e.g. yaml.safe_load, the parsed config is cached too
+    :return: decoded file content, parsed with parse, None if the config is not written
+    """
+    cache = secret_cache(deploy_config)
+    path = app_config_path(vault_credentials(cf_user, cf_pass, deploy_config)[secret_path], deploy_config)
+
+    def load():
+        with VaultSession(cf_user, cf_pass, deploy_config) as vault:
+            return read_app_config_data(vault.authenticated_client(), vault.vault_info[secret_path], deploy_config)
+
+    return cache.get(path, load, parse)
+
 
-    vault_path = '/'.join([service_secret_path.strip('/v1/'), group, config_data_path])
+def app_config_path(secret_path, deploy_config):
+    """ Vault path of the config file written by write_deployment_input, the key it is cached by """
+    vault = deploy_config['vault']
+    return '/'.join([secret_path.strip('/v1/'), vault['group'], vault['config_data_path']])
 
-    data = client.read(vault_path)
+
+def read_app_config_data(client, secret_path, deploy_config):
+    """ Read the config file written by write_deployment_input
+    :param client: hvac client
+    :param secret_path: service or space secret path
+    :return: decoded file content, None if the config is not written, lease duration in secs
+    """
+    data = client.read(app_config_path(secret_path, deploy_config))
     decoded_data = None
     if data is not None:
         response_data = data.get('data').get('file')
         decoded_data = base64.b64decode(response_data)
 
-    client.adapter.close()
-
-    return decoded_data
+    return decoded_data, lease_duration(data)
 
 
 def read_iam_app_config(client, vault_path):
-    data = client.read(vault_path)
-    response_data = data.get('data')
+    response_data = shared_secret_cache().get(vault_path, lambda: read_with_lease(client, vault_path))
     notification_service_id = response_data.get('am_service_account_id')
     publisher_id = response_data.get('am_publisher_id')
 
@@ -297,3 +372,223 @@ def read_iam_app_config(client, vault_path):
     LOGGER.info('Publisher id found is [%s]', publisher_id)
 
     return notification_service_id, publisher_id
+
+
+def read_with_lease(client, path):
+    """ Data of a vault path, None if the path is not written, and its lease duration in secs """
+    data = client.read(path)
+    return (data.get('data') if data is not None else None), lease_duration(data)
+
+
+def lease_duration(data):
+    """ Secs vault advises to cache a secret read for, 0 if it does not say """
+    return data.get('lease_duration', 0) if data is not None else 0
+
+
+def snapshot_vault(cf_user, cf_pass, deploy_config, file_path, secret_path='space_secret_path'):
+    """ Export the secrets under the space or service secret path to a snapshot file,
+    encrypted with the Fernet key of VAULT_SNAPSHOT_KEY when set.
+    :param secret_path: space_secret_path or service_secret_path
+    :return: paths of the secrets exported, relative to the secret path
+    """
+    with VaultSession(cf_user, cf_pass, deploy_config) as vault:
+        return vault.snapshot(vault.vault_info[secret_path], file_path, secret=os.environ.get('VAULT_SNAPSHOT_KEY'))
+
+
+def sync_vault(cf_user, cf_pass, deploy_config, file_path, secret_path='space_secret_path'):
+    """ Write the secrets of a snapshot under the space or service secret path of deploy_config,
+    only the secrets which differ are written. An encrypted snapshot is read with VAULT_SNAPSHOT_KEY.
+    :param secret_path: space_secret_path or service_secret_path
+    :return: {'written': [paths], 'unchanged': [paths], 'skipped': [paths]}
+    """
+    with VaultSession(cf_user, cf_pass, deploy_config) as vault:
+        return vault.sync(vault.vault_info[secret_path], file_path, secret=os.environ.get('VAULT_SNAPSHOT_KEY'))
+
+
+def list_secrets(client, vault_path, workers=8):
+    """ Paths of the secrets under vault_path, the folders of each level are listed concurrently
+    :return: paths relative to vault_path
+    """
+    root = vault_path.strip('/v1/')
+    paths = []
+    folders = ['']
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while folders:
+            listed = executor.map(lambda folder: client.list('/'.join([root, folder]).rstrip('/')), folders)
+            next_folders = []
+            for folder, response in zip(folders, listed):
+                for key in (response or {}).get('data', {}).get('keys', []):
+                    (next_folders if key.endswith('/') else paths).append(folder + key)
+            folders = next_folders
+    return sorted(paths)
+
+
+def snapshot_secrets(client, vault_path, file_path, workers=8, secret=None):
+    """ Export the secrets under vault_path to a JSON file readable by the owner only, the secrets are
+    read concurrently. The file is gzipped, or encrypted with Fernet with secret.
+    :param client: hvac client
+    :param vault_path: Secret path of the subtree, e.g. space_secret_path
+    :param file_path: Snapshot file
+    :param workers: Number of paths listed/read concurrently
+    :param secret: Optional Fernet key, requires cryptography
+    :return: paths of the secrets exported, relative to vault_path
+    """
+    root = vault_path.strip('/v1/')
+    paths = list_secrets(client, vault_path, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        secrets = dict(zip(paths, executor.map(lambda path: read_data(client, '/'.join([root, path])), paths)))
+
+    write_snapshot(file_path, {'vault_path': root, 'created_at': time.time(), 'secrets': secrets}, secret)
+    LOGGER.info('Vault snapshot of %s written to %s with %d secrets.', root, file_path, len(secrets))
+    return paths
+
+
+def sync_secrets(client, vault_path, file_path, workers=8, secret=None):
+    """ Write the secrets of a snapshot under vault_path, each path only when its data differs
+    A vault path holds all its keys in one secret, a path with a changed key is written whole.
+    Paths without data in the snapshot, e.g. deleted while it was taken, are skipped.
+    :param client: hvac client
+    :param vault_path: Secret path the snapshot is written under, e.g. space_secret_path of another environment
+    :param file_path: Snapshot file written by snapshot_secrets
+    :param workers: Number of paths read/written concurrently
+    :param secret: Fernet key the snapshot was encrypted with, if any
+    :return: {'written': [paths], 'unchanged': [paths], 'skipped': [paths]}
+    """
+    root = vault_path.strip('/v1/')
+    snapshot = read_snapshot(file_path, secret)['secrets']
+    secrets = {path: data for path, data in snapshot.items() if data is not None}
+
+    def sync(path):
+        target = '/'.join([root, path])
+        return write_if_changed(client, target, read_data(client, target), secrets[path])
+
+    summary = {'written': [], 'unchanged': [], 'skipped': sorted(set(snapshot) - set(secrets))}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for path, written in zip(secrets, executor.map(sync, secrets)):
+            summary['written' if written else 'unchanged'].append(path)
+
+    if summary['skipped']:
+        LOGGER.warning('Vault paths without data in %s skipped: %s', file_path, ', '.join(summary['skipped']))
+    LOGGER.info('Vault sync of %s to %s: %d paths written, %d unchanged, %d skipped.', file_path, root,
+                len(summary['written']), len(summary['unchanged']), len(summary['skipped']))
+    return summary
+
+
+def write_snapshot(file_path, snapshot, secret=None):
+    """ Write a snapshot to a gzip file readable by the owner only, encrypted with the Fernet key secret if any """
+    if secret:
+        EncryptedJsonFile(file_path, secret, 'the vault snapshot', compress=True).save(snapshot)
+        return
+    with open(os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as raw, \
+            gzip.open(raw, 'wt', encoding='utf-8') as _f:
+        json.dump(snapshot, _f)
+
+
+def read_snapshot(file_path, secret=None):
+    """ Snapshot written by write_snapshot
+    :raises ValueError: If the encrypted snapshot cannot be read with secret
+    """
+    if secret:
+        snapshot = EncryptedJsonFile(file_path, secret, 'the vault snapshot', compress=True).load()
+        if snapshot is None:
+            raise ValueError('Invalid input, vault snapshot {} cannot be read with the secret'.format(file_path))
+        return snapshot
+    with gzip.open(file_path, 'rt', encoding='utf-8') as _f:
+        return json.load(_f)
+
+
+class VaultSession:
+    """
+    Authenticated vault session reused across operations: one hvac client on a pooled HTTP session
+    and one approle token, renewed when its lease is about to expire.
+    Usage:
+
+    with VaultSession(cf_user, cf_pass, deploy_config) as vault:
+        vault.write_iam_app_config(vault.vault_info['space_secret_path'], group, config_data)
+        vault.read_app_config()
+    """
+
+    def __init__(self, cf_user, cf_pass, deploy_config, renew_margin=60, pool_maxsize=10):
+        """
+        :param renew_margin: Secs before the token lease expires it is renewed
+        :param pool_maxsize: Number of connections kept to vault
+        """
+        self.cf_user = cf_user
+        self.cf_pass = cf_pass
+        self.deploy_config = deploy_config
+        self.renew_margin = renew_margin
+        secret_cache(deploy_config)
+        # Vault logins and KV writes can be repeated safely, so POST is retried as well.
+        self.http = HttpSession(pool_maxsize=pool_maxsize, retry_methods=('GET', 'PUT', 'POST', 'LIST'))
+        self.lock = threading.Lock()
+        self.client = None
+        self.vault_info = None
+        self.expires_at = None
+        self.renewable = False
+        self.login()
+
+    def login(self):
+        self.client, self.vault_info, auth = vault_login(self.cf_user, self.cf_pass, self.deploy_config,
+                                                         self.http.session)
+        self.set_lease(auth)
+
+    def set_lease(self, auth):
+        lease_duration = auth.get('lease_duration', 0)
+        self.expires_at = time.time() + lease_duration if lease_duration else float('inf')
+        self.renewable = auth.get('renewable', False)
+
+    def authenticated_client(self):
+        """Client with a token valid for more than renew_margin secs, renewed or logged in again if needed."""
+        with self.lock:
+            if self.expires_at - self.renew_margin > time.time():
+                return self.client
+            if self.renewable:
+                try:
+                    self.set_lease(self.client.auth.token.renew_self()['auth'])
+                    LOGGER.debug('Vault token renewed.')
+                    return self.client
+                except VaultError as error:
+                    LOGGER.info('Vault token renewal failed, logging in again: %s', error)
+            self.login()
+            return self.client
+
+    def read(self, path):
+        return self.authenticated_client().read(path)
+
+    def write(self, path, **data):
+        return self.authenticated_client().write(path, **data)
+
+    def read_file_from_vault(self, secret_path, group):
+        return read_file_from_vault(self.authenticated_client(), secret_path, group)
+
+    def write_iam_app_config(self, vault_path, group, env_input_config_yml, workers=8):
+        return write_iam_app_config(self.authenticated_client(), vault_path, group, env_input_config_yml, workers)
+
+    def write_iam_credentials(self, path, env_input_config_yml):
+        return write_iam_credentials(self.authenticated_client(), path, env_input_config_yml)
+
+    def write_file_to_vault(self, vault_path, file_path):
+        return write_file_to_vault(self.authenticated_client(), vault_path, self.deploy_config, file_path)
+
+    def read_app_config(self, secret_path='service_secret_path'):
+        decoded_data, lease = read_app_config_data(self.authenticated_client(), self.vault_info[secret_path],
+                                                   self.deploy_config)
+        return decoded_data
+
+    def read_iam_app_config(self, vault_path):
+        return read_iam_app_config(self.authenticated_client(), vault_path)
+
+    def snapshot(self, vault_path, file_path, workers=8, secret=None):
+        return snapshot_secrets(self.authenticated_client(), vault_path, file_path, workers, secret)
+
+    def sync(self, vault_path, file_path, workers=8, secret=None):
+        return sync_secrets(self.authenticated_client(), vault_path, file_path, workers, secret)
+
+    def close(self):
+        self.http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()